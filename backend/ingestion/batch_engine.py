@@ -0,0 +1,147 @@
+"""
+Batched extraction engine for the ingestion service.
+- Splits a DataFrame into row chunks sized to a token budget
+- Runs an async worker over the chunks with a concurrency cap; workers
+  stream records, which are passed on before their chunk finishes
+- Re-queues only the rows of a failed chunk that produced no record yet,
+  unless the request deadline passed
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, List, Optional, Set
+
+import pandas as pd
+
+import deadline
+
+# Rough chars-per-token ratio for English/CSV text; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class RowChunk:
+    index: int
+    frame: pd.DataFrame
+    attempts: int = 0
+
+    @property
+    def source_rows(self) -> List[int]:
+        # source_row is 1-based and follows the original DataFrame index
+        return [int(i) + 1 for i in self.frame.index]
+
+
+@dataclass
+class ChunkOutcome:
+    chunk: RowChunk
+    providers: List[dict] = field(default_factory=list)
+    error: Optional[str] = None
+    # Rows settled by this outcome (resolved or given up on); empty while the
+    # chunk is still streaming records
+    settled_rows: List[int] = field(default_factory=list)
+    # Rows of a failed chunk for which no record came back
+    failed_rows: List[int] = field(default_factory=list)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def split_into_chunks(df: pd.DataFrame, token_budget: int, max_rows: int) -> List[RowChunk]:
+    """
+    Greedily packs consecutive rows into chunks whose CSV rendering stays
+    under `token_budget`. A single oversized row still gets its own chunk.
+    """
+    chunks: List[RowChunk] = []
+    if df.empty:
+        return chunks
+
+    # Per-row character count (cells plus separators), vectorized
+    row_chars = df.fillna("").astype(str).apply(lambda col: col.str.len()).sum(axis=1) + len(df.columns)
+    row_tokens = (row_chars // CHARS_PER_TOKEN + 1).tolist()
+    header_tokens = estimate_tokens(",".join(map(str, df.columns)))
+
+    start = 0
+    used = header_tokens
+    for pos, tokens in enumerate(row_tokens):
+        rows_in_chunk = pos - start
+        if rows_in_chunk and (used + tokens > token_budget or rows_in_chunk >= max_rows):
+            chunks.append(RowChunk(index=len(chunks), frame=df.iloc[start:pos]))
+            start = pos
+            used = header_tokens
+        used += tokens
+
+    chunks.append(RowChunk(index=len(chunks), frame=df.iloc[start:]))
+    return chunks
+
+
+async def run_chunks(
+    chunks: List[RowChunk],
+    worker: Callable[[RowChunk], AsyncIterator[List[dict]]],
+    concurrency: int,
+    retry_rounds: int,
+) -> AsyncIterator[ChunkOutcome]:
+    """
+    Runs `worker` over every chunk with at most `concurrency` in flight. Each
+    batch of records the worker yields (pinned to `source_row`) is passed on
+    immediately; a final outcome per chunk settles its rows. When a chunk
+    fails, the rows it produced no record for are re-queued as a smaller chunk
+    up to `retry_rounds` times; after that they are yielded in `failed_rows`.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    outcomes: asyncio.Queue = asyncio.Queue()
+
+    async def _run(chunk: RowChunk) -> None:
+        covered: Set[int] = set()
+        error = None
+        async with semaphore:
+            chunk.attempts += 1
+            try:
+                async for providers in worker(chunk):
+                    covered.update(p.get("source_row") for p in providers)
+                    await outcomes.put((chunk, providers, None, None))
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                error = str(detail)
+        await outcomes.put((chunk, [], error, covered))
+
+    tasks: Set[asyncio.Task] = set()
+
+    def _start(chunk: RowChunk) -> None:
+        task = asyncio.create_task(_run(chunk))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    for chunk in chunks:
+        _start(chunk)
+    running = len(chunks)
+    try:
+        while running:
+            chunk, providers, error, covered = await outcomes.get()
+            if covered is None:
+                yield ChunkOutcome(chunk=chunk, providers=providers)
+                continue
+            running -= 1
+            missing = [row for row in chunk.source_rows if row not in covered]
+            if not error or not missing:
+                yield ChunkOutcome(chunk=chunk, settled_rows=chunk.source_rows)
+                continue
+            # Past the request deadline a re-queued chunk could only fail again
+            if chunk.attempts <= retry_rounds and not deadline.expired():
+                print(
+                    f"[INGESTION] Chunk {chunk.index} failed (attempt {chunk.attempts}), "
+                    f"re-queueing {len(missing)}/{len(chunk.source_rows)} rows: {error[:200]}"
+                )
+                retry = RowChunk(
+                    index=chunk.index,
+                    frame=chunk.frame[[row not in covered for row in chunk.source_rows]],
+                    attempts=chunk.attempts,
+                )
+                _start(retry)
+                running += 1
+                yield ChunkOutcome(chunk=chunk, settled_rows=[r for r in chunk.source_rows if r in covered])
+                continue
+            yield ChunkOutcome(chunk=chunk, error=error, settled_rows=chunk.source_rows, failed_rows=missing)
+    finally:
+        for task in list(tasks):
+            task.cancel()
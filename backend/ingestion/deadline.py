@@ -0,0 +1,136 @@
+"""
+End-to-end request deadlines.
+- Callers send the time they are still willing to wait as X-Deadline-Ms
+  (milliseconds remaining, so clocks need not agree across hosts)
+- DeadlineMiddleware stores it in a contextvar for the request, cancels the
+  handler when it runs out and answers 504 if nothing was sent yet
+- budget() clips per-call timeouts to what is left and refuses to start work
+  that cannot finish, so retries shrink instead of stacking; exhausted() tells
+  a deadline-made timeout apart from a slow callee
+- Tasks started during the request inherit the contextvar
+Kept identical in ingestion/ and validation/.
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+DEADLINE_HEADER = "X-Deadline-Ms"
+# Below this much time left, new LLM attempts and retries are not started
+DEADLINE_MIN_ATTEMPT_SECONDS = float(os.getenv("DEADLINE_MIN_ATTEMPT_SECONDS", "1.0"))
+# Held back from every budget so the handler can still answer before the cut-off
+DEADLINE_RESPONSE_MARGIN_SECONDS = float(os.getenv("DEADLINE_RESPONSE_MARGIN_SECONDS", "0.5"))
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None without a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def exhausted() -> bool:
+    """
+    Whether too little time is left to start another call. A timeout that
+    fires in this state was set by the deadline, not by a slow callee.
+    """
+    left = remaining()
+    return left is not None and left - DEADLINE_RESPONSE_MARGIN_SECONDS < DEADLINE_MIN_ATTEMPT_SECONDS
+
+
+def clip(timeout: Optional[float]) -> Optional[float]:
+    """`timeout` clipped to the time left (minus the response margin); never raises."""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(left - DEADLINE_RESPONSE_MARGIN_SECONDS, 0.0)
+    return left if timeout is None else min(timeout, left)
+
+
+def budget(timeout: Optional[float]) -> Optional[float]:
+    """
+    clip(timeout), but raises DeadlineExceeded when too little is left to be
+    worth starting the call.
+    """
+    if exhausted():
+        left = remaining() - DEADLINE_RESPONSE_MARGIN_SECONDS
+        raise DeadlineExceeded(f"Deadline exceeded ({max(left, 0):.1f}s left)")
+    return clip(timeout)
+
+
+def can_wait(seconds: float) -> bool:
+    """Whether sleeping `seconds` (e.g. a retry backoff) still leaves room for another attempt."""
+    left = remaining()
+    return left is None or left - seconds - DEADLINE_RESPONSE_MARGIN_SECONDS >= DEADLINE_MIN_ATTEMPT_SECONDS
+
+
+def outgoing_headers() -> Dict[str, str]:
+    """Header that forwards the current deadline to a downstream service."""
+    left = remaining()
+    return {} if left is None else {DEADLINE_HEADER: str(max(int(left * 1000), 0))}
+
+
+def parse_header(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) / 1000.0 if value else None
+    except ValueError:
+        return None
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware, so it also covers streaming responses."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        seconds = parse_header(headers.get(DEADLINE_HEADER.lower()))
+        if seconds is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        token = _deadline.set(time.monotonic() + seconds)
+        try:
+            if seconds <= 0:
+                raise DeadlineExceeded("Deadline already passed on arrival")
+            # wait_for cancels the handler (and whatever it awaits) when time runs out
+            await asyncio.wait_for(self.app(scope, receive, tracking_send), seconds)
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            if not started:
+                body = json.dumps({"detail": "Deadline exceeded"}).encode("utf-8")
+                await send({
+                    "type": "http.response.start",
+                    "status": 504,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+                })
+                await send({"type": "http.response.body", "body": body})
+        finally:
+            _deadline.reset(token)
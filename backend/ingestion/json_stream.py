@@ -0,0 +1,157 @@
+"""
+Incremental, error-tolerant JSON parsing for LLM responses.
+- RecordStream is fed response text as it streams in and returns each record
+  (an object directly inside the document's first-level array, e.g. one
+  provider in {"providers": [...]}) as soon as its closing brace arrives
+- Markdown fences and prose around the JSON are skipped; trailing commas are
+  dropped before anything is decoded
+- document() parses the whole response; a truncated one is cut back to the
+  last complete record (or value) and closed, so completed records survive
+- extract_json() does the same for a response that is already complete
+Kept identical in ingestion/ and validation/.
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def strip_trailing_commas(text: str) -> str:
+    """Drops commas directly before a closing bracket, leaving string contents alone."""
+    out: List[str] = []
+    in_string = escaped = False
+    pending = None  # index in `out` of a comma that may turn out to be trailing
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch in "}]" and pending is not None:
+            del out[pending]
+        if not ch.isspace():
+            pending = None
+        if ch == '"':
+            in_string = True
+        elif ch == ",":
+            pending = len(out)
+        out.append(ch)
+    return "".join(out)
+
+
+def _loads(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(strip_trailing_commas(text))
+
+
+class RecordStream:
+    def __init__(self):
+        self.text = ""
+        self.complete = False
+        # Records whose text closed but would not decode
+        self.skipped = 0
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        # Nesting depth of the first array; objects directly inside arrays at
+        # that depth are records
+        self._record_depth: Optional[int] = None
+        self._record_start: Optional[int] = None
+        # Last place the document can be cut and closed: (offset, open brackets)
+        self._boundary: Optional[Tuple[int, Tuple[str, ...]]] = None
+
+    def feed(self, text: str) -> List[Any]:
+        """Consumes the next piece of the response; returns records completed by it."""
+        self.text += text
+        records: List[Any] = []
+        if self.complete:
+            return records
+
+        buf = self.text
+        stack = self._stack
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if self._start is None:
+                # Skip fences and prose until the document opens
+                if ch in _CLOSERS:
+                    self._start = i
+                else:
+                    continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                stack.append(ch)
+                depth = len(stack)
+                if ch == "[" and self._record_depth is None:
+                    self._record_depth = depth
+                elif (
+                    ch == "{"
+                    and self._record_depth is not None
+                    and depth == self._record_depth + 1
+                    and stack[-2] == "["
+                ):
+                    self._record_start = i
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+                depth = len(stack)
+                if not stack:
+                    self._end = i + 1
+                    self.complete = True
+                    self._pos = len(buf)
+                    return records
+                if self._record_depth is None or depth <= self._record_depth:
+                    self._boundary = (i + 1, tuple(stack))
+                if ch == "}" and self._record_start is not None and depth == self._record_depth:
+                    try:
+                        records.append(_loads(buf[self._record_start:i + 1]))
+                    except json.JSONDecodeError:
+                        self.skipped += 1
+                    self._record_start = None
+        self._pos = len(buf)
+        return records
+
+    def document(self) -> Any:
+        """
+        The parsed response. A truncated document is closed at its last
+        complete record; raises ValueError when nothing usable arrived.
+        """
+        if self._start is None:
+            raise ValueError("No JSON document in LLM response")
+        if self.complete:
+            return _loads(self.text[self._start:self._end])
+        if self._boundary is None:
+            raise ValueError("LLM response cut off before the first complete record")
+        end, open_brackets = self._boundary
+        head = strip_trailing_commas(self.text[self._start:end]).rstrip().rstrip(",")
+        return _loads(head + "".join(_CLOSERS[b] for b in reversed(open_brackets)))
+
+
+def extract_json(content: str) -> Any:
+    """Parses a complete LLM response, tolerating fences, prose, trailing commas and truncation."""
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    stream = RecordStream()
+    stream.feed(content)
+    return stream.document()
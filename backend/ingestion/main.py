@@ -2,6 +2,11 @@
 Valid8 Ingestion Microservice
 - Uses llm_client for generation
 - LLM agnostic (Gemini / Ollama via env vars)
+- /ingest/csv returns everything at once; /ingest/csv/stream emits NDJSON batches
+  interleaved with row-level progress events
+- X-Deadline-Ms bounds the whole request; retries shrink to what is left
+- Chunk responses are streamed and parsed incrementally (json_stream), so
+  records go out as they close and a cut-off response keeps its complete ones
 """
 
 import os
@@ -11,19 +16,32 @@ from dotenv import load_dotenv
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"), override=True)
 
 import json
-import re
 import secrets
 import asyncio
-from typing import List, Dict, Any, Optional
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from io import StringIO
 
 import pandas as pd
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-# --- REFACTOR: Import generate from local llm_client ---
-from llm_client import generate
+# --- REFACTOR: Import the shared async LLM client ---
+from llm_client import LLMClient, LLM_ESCALATION_THRESHOLD, TIER_FAST, TIER_STRONG
+import deadline
+from deadline import DeadlineMiddleware, DeadlineExceeded
+from llm_cache import cache_stats
+from batch_engine import split_into_chunks, run_chunks, RowChunk
+from json_stream import RecordStream, extract_json
+from rule_extractor import extract_rows
+from mapping_plan import (
+    MappingPlan, PlanStore, header_signature, build_plan_prompt, validate_plan,
+    apply_plan, plan_rows_to_providers,
+)
 
 # -----------------------------------------------------------------------------
 # CONFIG
@@ -32,9 +50,26 @@ STANDARD_FIELDS = [
     "provider_id", "name", "specialty", "phone", "email", "address", "npi_number", "license_number",
 ]
 
-MAX_ROWS_TO_SAMPLE = int(os.getenv("MAX_ROWS_TO_SAMPLE", "50"))
+# Chunking: rows per LLM request are bounded by both a token budget and a row cap
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "3000"))
+MAX_ROWS_PER_CHUNK = int(os.getenv("MAX_ROWS_PER_CHUNK", "20"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+CHUNK_RETRY_ROUNDS = int(os.getenv("CHUNK_RETRY_ROUNDS", "2"))
+# Deterministic pre-extraction; rows it fully resolves skip the LLM
+RULE_EXTRACTION_ENABLED = os.getenv("RULE_EXTRACTION_ENABLED", "true").lower() == "true"
+# Mapping plans: learned once per header layout, then applied without the LLM
+MAPPING_PLAN_ENABLED = os.getenv("MAPPING_PLAN_ENABLED", "true").lower() == "true"
+MAPPING_PLAN_DIR = os.getenv("MAPPING_PLAN_DIR", os.path.join(os.path.dirname(__file__), ".mapping_plans"))
+PLAN_MIN_ROWS = int(os.getenv("PLAN_MIN_ROWS", "50"))
+PLAN_SAMPLE_ROWS = int(os.getenv("PLAN_SAMPLE_ROWS", "20"))
+PLAN_MIN_FIT_RATE = float(os.getenv("PLAN_MIN_FIT_RATE", "0.8"))
 LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120.0"))
+# Reported on /health; the orchestrator's dedupe treats a change as a new pipeline.
+# Bump when prompts or cleaning rules change.
+PIPELINE_VERSION = os.getenv("PIPELINE_VERSION", "1")
 RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+# /ingest/csv/stream: plan- and rule-resolved providers go out in batches of this size
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "50"))
 
 # -----------------------------------------------------------------------------
 # Pydantic models
@@ -68,6 +103,7 @@ class CleanedProvider(BaseModel):
     confidence: ProviderConfidence
     ai_notes: List[str] = []
     source_row: int
+    rule_resolved_fields: List[str] = []
     validation: Optional[ProviderValidation] = None
 
 class ProviderList(BaseModel):
@@ -80,15 +116,37 @@ class IngestionResponse(BaseModel):
     processing_notes: List[str] = []
 
 
+PLAN_STORE = PlanStore(MAPPING_PLAN_DIR)
+# One learner per header signature; concurrent uploads of a new layout wait for it
+PLAN_LEARNING: Dict[str, asyncio.Lock] = {}
+# Chunks go to the fast tier (GEMINI_MODEL) first; unsure records escalate to GEMINI_STRONG_MODEL
+LLM = LLMClient(
+    gemini_models={
+        TIER_FAST: ("GEMINI_MODEL", "gemini-1.5-flash"),
+        TIER_STRONG: ("GEMINI_STRONG_MODEL", "gemini-1.5-pro"),
+    },
+    default_tier=TIER_FAST,
+)
+
+
 # -----------------------------------------------------------------------------
 # FastAPI app
 # -----------------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await LLM.aclose()
+
+
 app = FastAPI(
     title="Valid8 Ingestion",
     description="AI-powered healthcare provider data cleaning using agnostic LLM",
     version="1.2.0",
+    lifespan=lifespan,
 )
 
+# X-Deadline-Ms from the orchestrator bounds every LLM call made for the request
+app.add_middleware(DeadlineMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -106,7 +164,11 @@ def generate_temp_id() -> str:
 
 
 def prepare_prompt_from_csv(df: pd.DataFrame) -> str:
-    csv_sample = df.head(MAX_ROWS_TO_SAMPLE).to_csv(index=False)
+    # Prefix each row with its 1-based position in the original file so chunk
+    # results can be merged back in order.
+    chunk = df.copy()
+    chunk.insert(0, "source_row", [int(i) + 1 for i in df.index])
+    csv_sample = chunk.to_csv(index=False)
     prompt = f"""You are a specialized data extraction AI.
 TASK: Extract provider information from the CSV below and return a JSON object.
 
@@ -151,61 +213,55 @@ PROCESSING RULES:
 3. Clean phone numbers (remove dashes/parens).
 4. Assign a confidence score (0.0 to 1.0) for each field based on extraction quality.
 5. If a field is missing, use null.
-6. Return ONLY the JSON object.
+6. Copy "source_row" unchanged from the source_row column of each CSV row.
+7. Return ONLY the JSON object.
 """
     return prompt
 
 
+def format_row_ranges(rows: List[int]) -> str:
+    """Compacts [1, 2, 3, 7] into "1-3, 7" for notes and logs."""
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
 def robust_extract_json(content: str) -> Dict[str, Any]:
     try:
-        return json.loads(content)
-    except Exception:
-        pass
-
-    content_clean = content.replace("```json", "").replace("```", "")
-    
-    # Simple regex fallback
-    regex_match = re.search(r'\{(?:[^{}]|\n|\r)*\}', content_clean)
-    if regex_match:
-        candidate = regex_match.group(0)
-        # basic cleanup for common trailing comma issues
-        candidate = re.sub(r",\s*}", "}", candidate)
-        candidate = re.sub(r",\s*\]", "]", candidate)
-        try:
-            return json.loads(candidate)
-        except Exception:
-            pass
-
-    # If simple regex fails, try the iterative approach or just error out
-    raise HTTPException(status_code=500, detail="LLM did not return valid JSON. Response truncated: " + content[:200])
+        return extract_json(content)
+    except ValueError:
+        raise HTTPException(status_code=500, detail="LLM did not return valid JSON. Response truncated: " + content[:200])
 
 
 async def call_llm_with_retries(prompt: str, response_model: Any = None) -> Dict[str, Any]:
     """
     Calls the configured LLM provider using the llm_client.
-    Manages retries and event loop blocking.
+    Manages retries and timeouts; both shrink to the request deadline.
     """
-    
-    async def _call_once():
-        def blocking_call():
-            return generate(prompt, response_model=response_model)
-        
-        # Run blocking wrapper in thread
-        return await asyncio.to_thread(blocking_call)
-
     backoff = 1.0
     for attempt in range(RETRY_ATTEMPTS):
         try:
-            raw_text = await asyncio.wait_for(_call_once(), timeout=LLM_TIMEOUT_SECONDS)
+            # Retries skip the response cache so a bad cached answer is not replayed
+            raw_text = await LLM.generate(
+                prompt, response_model=response_model, use_cache=attempt == 0, timeout=LLM_TIMEOUT_SECONDS
+            )
             if not raw_text:
                 raise ValueError("Empty response from LLM")
                 
-            parsed = robust_extract_json(raw_text)
+            try:
+                parsed = robust_extract_json(raw_text)
+            except HTTPException:
+                await LLM.invalidate(prompt, response_model)
+                raise
             return parsed
-        except HTTPException:
+        except (HTTPException, DeadlineExceeded):
             raise
         except Exception as e:
-            if attempt < RETRY_ATTEMPTS - 1:
+            if attempt < RETRY_ATTEMPTS - 1 and deadline.can_wait(backoff):
                 await asyncio.sleep(backoff)
                 backoff *= 2
                 continue
@@ -214,6 +270,185 @@ async def call_llm_with_retries(prompt: str, response_model: Any = None) -> Dict
     raise HTTPException(status_code=500, detail="LLM error unknown")
 
 
+def extract_provider_list(llm_response: Any) -> List[Dict[str, Any]]:
+    """Normalizes the different shapes LLMs return into a list of provider dicts."""
+    # Handle case where LLM returns just a list
+    if isinstance(llm_response, list):
+        llm_response = {"providers": llm_response}
+
+    # Handle case where LLM used a different key (e.g., "data", "results")
+    if "providers" not in llm_response:
+        # Search for any list value in the dictionary
+        for key, value in llm_response.items():
+            if isinstance(value, list):
+                llm_response["providers"] = value
+                break
+
+    if "providers" not in llm_response or not isinstance(llm_response["providers"], list):
+        raise HTTPException(
+            status_code=500,
+            detail=f"LLM output missing 'providers' list. Got: {str(llm_response)[:500]}",
+        )
+    return [p for p in llm_response["providers"] if isinstance(p, dict)]
+
+
+async def stream_llm_records(prompt: str, tier: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Streams the LLM response through json_stream and yields provider records
+    as each one closes. Attempts that fail before the first record are retried
+    like call_llm_with_retries; once records are out, a failure or a cut-off
+    response is raised so the caller re-sends only the rows still missing.
+    """
+    backoff = 1.0
+    for attempt in range(RETRY_ATTEMPTS):
+        parser = RecordStream()
+        emitted = 0
+        try:
+            # Retries skip the response cache so a bad cached answer is not replayed
+            async for text in LLM.generate_stream(
+                prompt, use_cache=attempt == 0, timeout=LLM_TIMEOUT_SECONDS, tier=tier
+            ):
+                records = [r for r in parser.feed(text) if isinstance(r, dict)]
+                if records:
+                    emitted += len(records)
+                    yield records
+            if not parser.text.strip():
+                raise ValueError("Empty response from LLM")
+        except (HTTPException, DeadlineExceeded):
+            raise
+        except Exception as e:
+            if not emitted and attempt < RETRY_ATTEMPTS - 1 and deadline.can_wait(backoff):
+                await asyncio.sleep(backoff)
+                backoff *= 2
+                continue
+            raise HTTPException(status_code=500, detail=f"LLM Provider error: {str(e)}")
+
+        if not emitted:
+            # No record array (or an empty one): fall back to the whole document
+            try:
+                records = extract_provider_list(parser.document())
+            except (ValueError, HTTPException):
+                await LLM.invalidate(prompt, tier=tier)
+                raise HTTPException(
+                    status_code=500,
+                    detail="LLM did not return valid JSON. Response truncated: " + parser.text[:200],
+                )
+            if records:
+                emitted = len(records)
+                yield records
+        if not parser.complete:
+            await LLM.invalidate(prompt, tier=tier)
+            raise HTTPException(status_code=500, detail=f"LLM response cut off after {emitted} records")
+        return
+
+
+def pin_source_row(provider: Dict[str, Any], source_rows: List[int], position: int) -> None:
+    try:
+        row = int(provider.get("source_row"))
+    except (TypeError, ValueError):
+        row = None
+    # LLM dropped or invented the row number; fall back to position in chunk
+    provider["source_row"] = row if row in source_rows else source_rows[min(position, len(source_rows) - 1)]
+
+
+def needs_escalation(provider: Dict[str, Any]) -> bool:
+    """
+    Whether a fast-tier record should be redone on the strong tier: it has no
+    confidence map, or a field it filled in scores below LLM_ESCALATION_THRESHOLD
+    (a missing score counts as unsure).
+    """
+    scores = provider.get("confidence")
+    if not isinstance(scores, dict):
+        return True
+    for field in STANDARD_FIELDS:
+        if provider.get(field) in (None, ""):
+            continue
+        score = scores.get(field)
+        if not isinstance(score, (int, float)) or not LLM_ESCALATION_THRESHOLD <= score <= 1.0:
+            return True
+    return False
+
+
+async def extract_chunk(chunk: RowChunk, routing: Optional[Dict[str, int]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Streams one chunk through the LLM, pinning each record to a source row as
+    it closes. With routing, the fast tier goes first and only the rows with a
+    record that needs_escalation are re-extracted on the strong tier. Records
+    per tier and escalations are counted into `routing`.
+    """
+    routing = routing if routing is not None else {}
+    tiers = LLM.tiers()
+    current = chunk
+    for n, tier in enumerate(tiers):
+        escalate = n < len(tiers) - 1
+        source_rows = current.source_rows
+        held_rows = set()
+        position = 0
+        async for providers in stream_llm_records(prepare_prompt_from_csv(current.frame), tier):
+            ready = []
+            for provider in providers:
+                pin_source_row(provider, source_rows, position)
+                position += 1
+                if escalate and (provider["source_row"] in held_rows or needs_escalation(provider)):
+                    held_rows.add(provider["source_row"])
+                    routing["escalated"] = routing.get("escalated", 0) + 1
+                else:
+                    ready.append(provider)
+            routing[tier] = routing.get(tier, 0) + len(ready)
+            if ready:
+                yield ready
+        if not held_rows:
+            return
+        current = RowChunk(index=chunk.index, frame=current.frame[[row in held_rows for row in source_rows]])
+
+
+async def resolve_with_mapping_plan(df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], pd.DataFrame, List[str]]:
+    """
+    Applies the cached plan for this header layout, learning one first if the
+    file is big enough to be worth it. Returns (providers, unfitted rows, notes).
+    """
+    signature = header_signature(list(df.columns))
+    plan = await asyncio.to_thread(PLAN_STORE.load, signature)
+    if plan is not None:
+        plan = validate_plan(plan, df, STANDARD_FIELDS, PLAN_SAMPLE_ROWS)
+    learned = plan is None
+
+    if plan is None:
+        if len(df) < PLAN_MIN_ROWS:
+            return [], df, []
+        async with PLAN_LEARNING.setdefault(signature, asyncio.Lock()):
+            # Another upload may have learned this layout while we waited
+            plan = await asyncio.to_thread(PLAN_STORE.load, signature)
+            if plan is not None:
+                plan = validate_plan(plan, df, STANDARD_FIELDS, PLAN_SAMPLE_ROWS)
+                learned = plan is None
+            if plan is None:
+                try:
+                    print(f"[INGESTION] Learning mapping plan for header signature {signature}...")
+                    prompt = build_plan_prompt(df, STANDARD_FIELDS, PLAN_SAMPLE_ROWS)
+                    raw_plan = await call_llm_with_retries(prompt, response_model=MappingPlan)
+                    plan = validate_plan(MappingPlan(**raw_plan), df, STANDARD_FIELDS, PLAN_SAMPLE_ROWS)
+                except Exception as e:
+                    print(f"[INGESTION ERROR] Mapping plan generation failed: {e}")
+                    return [], df, [f"Mapping plan unavailable for layout {signature}"]
+                if plan is None:
+                    return [], df, [f"Mapping plan for layout {signature} was unusable"]
+                values, fits = apply_plan(df, plan)
+                fit_rate = float(fits.mean())
+                if fit_rate >= PLAN_MIN_FIT_RATE:
+                    await asyncio.to_thread(PLAN_STORE.save, signature, list(df.columns), plan, fit_rate)
+
+    if not learned:
+        values, fits = apply_plan(df, plan)
+
+    providers = plan_rows_to_providers(values[fits], STANDARD_FIELDS, signature)
+    notes = [
+        f"Mapping plan {signature} ({'learned' if learned else 'cached'}) covered "
+        f"{int(fits.sum())}/{len(df)} rows"
+    ]
+    return providers, df[~fits], notes
+
+
 def post_process_providers(providers: List[Dict[str, Any]]) -> List[CleanedProvider]:
     processed = []
     for provider_data in providers:
@@ -249,20 +484,116 @@ def post_process_providers(providers: List[Dict[str, Any]]) -> List[CleanedProvi
 
 
 # -----------------------------------------------------------------------------
-# API endpoints
+# Pipeline
 # -----------------------------------------------------------------------------
-@app.get("/health")
-async def health_check():
-    return {
-        "status": "healthy",
-        "service": "valid8-ingestion",
-        "version": "1.2.0",
-        "llm_provider": os.getenv("LLM_PROVIDER", "gemini")
-    }
-
+class IngestionRun:
+    """
+    One CSV through mapping plan -> rules -> LLM chunks. `batches()` yields
+    cleaned providers as each stage resolves them, so callers can stream them
+    on; counters for the processing notes fill in as it goes.
+    """
 
-@app.post("/ingest/csv", response_model=IngestionResponse)
-async def ingest_csv(file: UploadFile = File(...)):
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.plan_notes: List[str] = []
+        self.plan_rows = 0
+        self.rule_rows = 0
+        self.llm_rows = 0
+        self.chunk_count = 0
+        self.provider_count = 0
+        self.failed_rows: List[int] = []
+        self.errors: List[str] = []
+        # LLM records per model tier, plus how many fast-tier records were escalated
+        self.routing: Dict[str, int] = {}
+        # Source rows settled so far (resolved or failed)
+        self.rows_done = 0
+        self.started = time.monotonic()
+
+    @property
+    def status(self) -> str:
+        return "partial" if self.failed_rows else "success"
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "rows_done": self.rows_done,
+            "total_rows": len(self.df),
+            "rows_per_second": round(self.rows_done / elapsed, 2) if elapsed > 0 else None,
+        }
+
+    def _emit(self, raw_providers: List[Dict[str, Any]]) -> List[CleanedProvider]:
+        providers = post_process_providers(raw_providers)
+        self.provider_count += len(providers)
+        return providers
+
+    async def batches(self) -> AsyncIterator[List[CleanedProvider]]:
+        df = self.df
+
+        # 1. Mapping plan for known layouts
+        remaining_df = df
+        resolved: List[Dict[str, Any]] = []
+        if MAPPING_PLAN_ENABLED:
+            resolved, remaining_df, self.plan_notes = await resolve_with_mapping_plan(df)
+        self.plan_rows = len(resolved)
+
+        # 2. Rule-based fast path
+        extractions = extract_rows(remaining_df) if RULE_EXTRACTION_ENABLED else {}
+        for extraction in extractions.values():
+            if not extraction.needs_llm:
+                resolved.append(extraction.to_provider(STANDARD_FIELDS))
+        self.rule_rows = len(resolved) - self.plan_rows
+        llm_df = remaining_df[[
+            extractions.get(int(i) + 1) is None or extractions[int(i) + 1].needs_llm
+            for i in remaining_df.index
+        ]]
+        self.llm_rows = len(llm_df)
+        self.rows_done = len(df) - self.llm_rows
+
+        for start in range(0, len(resolved), STREAM_BATCH_SIZE):
+            yield self._emit(resolved[start:start + STREAM_BATCH_SIZE])
+
+        # 3. LLM extraction for whatever the rules could not resolve
+        chunks = split_into_chunks(llm_df, CHUNK_TOKEN_BUDGET, MAX_ROWS_PER_CHUNK)
+        self.chunk_count = len(chunks)
+        print(
+            f"[INGESTION] {self.plan_rows}/{len(df)} rows resolved by mapping plan, {self.rule_rows} by rules; "
+            f"extracting {len(llm_df)} rows in {len(chunks)} chunks (concurrency {LLM_CONCURRENCY})..."
+        )
+
+        # Records stream out as the LLM closes them; settled rows drive progress
+        worker = partial(extract_chunk, routing=self.routing)
+        async for outcome in run_chunks(chunks, worker, LLM_CONCURRENCY, CHUNK_RETRY_ROUNDS):
+            self.rows_done += len(outcome.settled_rows)
+            if outcome.error:
+                print(f"[INGESTION ERROR] Chunk {outcome.chunk.index} failed: {outcome.error}")
+                self.failed_rows.extend(outcome.failed_rows)
+                self.errors.append(outcome.error)
+            raw = []
+            for provider in outcome.providers:
+                extraction = extractions.get(provider["source_row"])
+                raw.append(extraction.apply_to(provider) if extraction else provider)
+            yield self._emit(raw)
+
+    def processing_notes(self) -> List[str]:
+        notes = [
+            f"Processed {len(self.df)} rows from CSV",
+            *self.plan_notes,
+            f"Resolved {self.rule_rows} rows with rules, sent {self.llm_rows} rows to the LLM in {self.chunk_count} chunks",
+            f"Extracted {self.provider_count} provider records",
+            f"Using LLM Provider: {os.getenv('LLM_PROVIDER', 'gemini')}"
+        ]
+        if self.routing.get("escalated"):
+            notes.append(
+                f"Escalated {self.routing['escalated']} low-confidence records from the fast to the strong model"
+            )
+        if self.failed_rows:
+            notes.append(
+                f"Extraction failed for {len(self.failed_rows)} rows: {format_row_ranges(self.failed_rows)}"
+            )
+        return notes
+
+
+async def read_csv_upload(file: UploadFile) -> pd.DataFrame:
     if not file.filename.lower().endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are supported.")
 
@@ -279,57 +610,112 @@ async def ingest_csv(file: UploadFile = File(...)):
 
     if df.empty:
         raise HTTPException(status_code=400, detail="CSV file contains no rows.")
+    return df
 
-    prompt = prepare_prompt_from_csv(df)
-    
-    # Try LLM call with detailed error logging
-    try:
-        print(f"[INGESTION] Calling LLM with {len(df)} rows...")
-        llm_response = await call_llm_with_retries(prompt)
-        print(f"[INGESTION] LLM response received: {str(llm_response)[:200]}")
-    except Exception as e:
-        error_msg = f"LLM call failed: {str(e)}"
-        print(f"[INGESTION ERROR] {error_msg}")
-        raise HTTPException(status_code=500, detail=error_msg)
 
-    # Handle case where LLM returns just a list
-    if isinstance(llm_response, list):
-        llm_response = {"providers": llm_response}
+# -----------------------------------------------------------------------------
+# API endpoints
+# -----------------------------------------------------------------------------
+def pipeline_config() -> Dict[str, Any]:
+    return {
+        "service": "valid8-ingestion",
+        "version": app.version,
+        "pipeline_version": PIPELINE_VERSION,
+        "llm_provider": os.getenv("LLM_PROVIDER", "gemini"),
+        "llm_routing": LLM.routing_snapshot(),
+    }
 
-    # Handle case where LLM used a different key (e.g., "data", "results")
-    if "providers" not in llm_response:
-        # Search for any list value in the dictionary
-        for key, value in llm_response.items():
-            if isinstance(value, list):
-                llm_response["providers"] = value
-                break
 
-    if "providers" not in llm_response or not isinstance(llm_response["providers"], list):
-        error_detail = f"LLM output missing 'providers' list. Got: {str(llm_response)[:500]}"
-        print(f"[INGESTION ERROR] {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+@app.get("/config")
+async def config():
+    """What shapes this service's output, without stats; the orchestrator fingerprints it for dedupe."""
+    return pipeline_config()
+
+
+@app.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        **pipeline_config(),
+        "llm_cache": cache_stats(),
+    }
+
+
+@app.post("/ingest/csv", response_model=IngestionResponse)
+async def ingest_csv(file: UploadFile = File(...)):
+    df = await read_csv_upload(file)
+    run = IngestionRun(df)
 
-    # Process providers with error handling
+    providers: List[CleanedProvider] = []
     try:
-        providers = post_process_providers(llm_response["providers"])
-        print(f"[INGESTION] Successfully processed {len(providers)} providers")
+        async for batch in run.batches():
+            providers.extend(batch)
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Post-processing failed: {str(e)}"
         print(f"[INGESTION ERROR] {error_msg}")
         raise HTTPException(status_code=500, detail=error_msg)
 
+    if run.failed_rows and not providers:
+        error_msg = f"LLM call failed: {run.errors[0]}"
+        print(f"[INGESTION ERROR] {error_msg}")
+        raise HTTPException(status_code=500, detail=error_msg)
+
+    providers.sort(key=lambda p: p.source_row)
+    print(f"[INGESTION] Successfully processed {len(providers)} providers")
+
     return IngestionResponse(
-        status="success",
+        status=run.status,
         total_providers=len(providers),
         providers=providers,
-        processing_notes=[
-            f"Processed {len(df)} rows from CSV",
-            f"Extracted {len(providers)} provider records",
-            f"Using LLM Provider: {os.getenv('LLM_PROVIDER', 'gemini')}"
-        ],
+        processing_notes=run.processing_notes(),
     )
 
 
+@app.post("/ingest/csv/stream")
+async def ingest_csv_stream(file: UploadFile = File(...)):
+    """
+    NDJSON stream of the same pipeline, one JSON object per line:
+    {"type": "start", "total_rows"}, then {"type": "providers", "providers"}
+    as each batch resolves, each followed by {"type": "progress", "rows_done",
+    "total_rows", "rows_per_second"}, then {"type": "summary", ...} (with
+    per-tier "routing" counts) or {"type": "error", "detail"}.
+    """
+    df = await read_csv_upload(file)
+    run = IngestionRun(df)
+
+    def line(event: Dict[str, Any]) -> bytes:
+        return (json.dumps(event) + "\n").encode("utf-8")
+
+    async def events() -> AsyncIterator[bytes]:
+        yield line({"type": "start", "total_rows": len(df)})
+        try:
+            async for batch in run.batches():
+                if batch:
+                    yield line({"type": "providers", "providers": [p.model_dump() for p in batch]})
+                yield line({"type": "progress", **run.progress()})
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            print(f"[INGESTION ERROR] Stream aborted: {detail}")
+            yield line({"type": "error", "detail": detail})
+            return
+
+        if run.failed_rows and not run.provider_count:
+            yield line({"type": "error", "detail": f"LLM call failed: {run.errors[0]}"})
+            return
+        print(f"[INGESTION] Streamed {run.provider_count} providers")
+        yield line({
+            "type": "summary",
+            "status": run.status,
+            "total_providers": run.provider_count,
+            "processing_notes": run.processing_notes(),
+            "routing": run.routing,
+        })
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
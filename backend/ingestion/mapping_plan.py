@@ -0,0 +1,281 @@
+"""
+Learned header-to-schema mapping plans for the ingestion service.
+- One LLM call per distinct header signature produces a MappingPlan
+- Plans are cached on disk as JSON, keyed by a hash of the normalized headers;
+  rule columns are re-bound to this file's exact headers through the same normalization
+- Plan files are written atomically (temp file + os.replace) under a lock
+- LLM-proposed regexes must compile, avoid nested quantifiers and run a timed
+  trial on sample cells within PLAN_REGEX_BUDGET_MS; cells are truncated before matching
+- Applying a plan is vectorized pandas work; rows that don't fit fall back to rules + LLM
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from pydantic import BaseModel, ValidationError
+
+from rule_extractor import normalize_header
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+TRANSFORMS = ["none", "strip", "title", "name", "upper", "lower", "digits", "phone", "email", "license"]
+
+# Values a field must look like after its transform for a row to "fit" the plan
+FIELD_VALIDATORS = {
+    "npi_number": r"^\d{10}$",
+    "phone": r"^\+\d{11,15}$",
+    "email": r"^[^@\s]+@[^@\s]+\.[A-Za-z]{2,}$",
+}
+
+PLAN_CONFIDENCE = 0.9
+
+PLAN_PATTERN_MAX_LENGTH = int(os.getenv("PLAN_PATTERN_MAX_LENGTH", "200"))
+PLAN_CELL_MAX_CHARS = int(os.getenv("PLAN_CELL_MAX_CHARS", "512"))
+PLAN_REGEX_BUDGET_MS = float(os.getenv("PLAN_REGEX_BUDGET_MS", "50"))
+
+# A quantified group that itself contains a quantifier, e.g. (a+)+ or (\w+\s?)*:
+# the classic shape of catastrophic backtracking
+NESTED_QUANTIFIER = re.compile(r"\((?:[^()\\]|\\.)*[+*}](?:[^()\\]|\\.)*\)(?:[+*]|\{\d*,)")
+
+
+# -----------------------------------------------------------------------------
+# Models
+# -----------------------------------------------------------------------------
+class FieldRule(BaseModel):
+    field: str
+    column: str = ""
+    pattern: str = ""
+    transform: str = "none"
+
+
+class MappingPlan(BaseModel):
+    rules: List[FieldRule]
+
+
+# -----------------------------------------------------------------------------
+# Signature + storage
+# -----------------------------------------------------------------------------
+def header_signature(columns: List) -> str:
+    normalized = "\x1f".join(normalize_header(c) for c in columns)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class PlanStore:
+    """One JSON file per header signature; small enough to inspect and edit by hand."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, signature: str) -> str:
+        return os.path.join(self.directory, f"{signature}.json")
+
+    def load(self, signature: str) -> Optional[MappingPlan]:
+        try:
+            with self._lock, open(self._path(signature), "r", encoding="utf-8") as fh:
+                return MappingPlan(**json.load(fh)["plan"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, ValidationError) as e:
+            print(f"[INGESTION] Ignoring unreadable mapping plan {signature}: {e}")
+            return None
+
+    def save(self, signature: str, columns: List, plan: MappingPlan, fit_rate: float) -> None:
+        payload = {
+            "signature": signature,
+            "columns": [str(c) for c in columns],
+            "plan": plan.model_dump(),
+            "fit_rate": round(fit_rate, 4),
+            "created_at": time.time(),
+        }
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            # Unique temp name: other worker processes may be saving the same signature
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{signature}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    json.dump(payload, fh, indent=2)
+                os.replace(tmp_path, self._path(signature))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+
+# -----------------------------------------------------------------------------
+# Learning
+# -----------------------------------------------------------------------------
+def build_plan_prompt(df: pd.DataFrame, standard_fields: List[str], sample_rows: int) -> str:
+    sample = df.head(sample_rows).to_csv(index=False)
+    return f"""You are a data mapping AI.
+TASK: Describe how to extract each target field from CSV files with the layout below.
+Do NOT extract the data itself; return reusable extraction rules.
+
+COLUMNS: {json.dumps([str(c) for c in df.columns])}
+
+SAMPLE ROWS:
+{sample}
+
+TARGET FIELDS: {json.dumps(standard_fields)}
+
+For every target field return one rule object:
+- "field": the target field name
+- "column": the exact source column holding it, or "" if no column contains it
+- "pattern": "" if the whole cell is the value, otherwise a Python regex with exactly
+  one capture group that isolates the value inside the cell
+- "transform": one of {json.dumps(TRANSFORMS)}
+  (name = Title Case person name, phone = E.164 US phone, digits = keep digits only,
+  license = uppercase without separators)
+
+Return ONLY a JSON object: {{"rules": [...]}}
+"""
+
+
+def _resolve_column(column: str, columns: List) -> Optional[str]:
+    """Exact header first, then the one header that normalizes the same way."""
+    names = [str(c) for c in columns]
+    if column in names:
+        return column
+    matches = [n for n in names if normalize_header(n) == normalize_header(column)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _compile_pattern(pattern: str, cells: List[str]) -> Optional[str]:
+    """
+    Returns the pattern with exactly one capture group, or None if it does not
+    compile, looks prone to catastrophic backtracking, or is too slow on the sample.
+    """
+    if len(pattern) > PLAN_PATTERN_MAX_LENGTH or NESTED_QUANTIFIER.search(pattern):
+        return None
+    try:
+        compiled = re.compile(pattern)
+    except re.error:
+        return None
+    if compiled.groups > 1:
+        return None
+    if compiled.groups == 0:
+        pattern = f"({pattern})"
+        compiled = re.compile(pattern)
+
+    # Sample cells plus one worst-case-length cell, as apply_plan would see them
+    probes = [c[:PLAN_CELL_MAX_CHARS] for c in cells]
+    if cells:
+        longest = max(cells, key=len) or " "
+        probes.append((longest * (PLAN_CELL_MAX_CHARS // len(longest) + 1))[:PLAN_CELL_MAX_CHARS])
+    started = time.perf_counter()
+    for cell in probes:
+        compiled.search(cell)
+        if (time.perf_counter() - started) * 1000 > PLAN_REGEX_BUDGET_MS:
+            return None
+    return pattern
+
+
+def validate_plan(
+    plan: MappingPlan, df: pd.DataFrame, standard_fields: List[str], sample_rows: int = 20
+) -> Optional[MappingPlan]:
+    """
+    Drops rules that reference unknown columns/fields or carry unusable regexes,
+    and binds each rule to this file's exact column name.
+    """
+    columns = list(df.columns)
+    by_name = {str(c): c for c in columns}
+    sample = df.head(sample_rows)
+    rules: List[FieldRule] = []
+    for rule in plan.rules:
+        column = _resolve_column(rule.column, columns) if rule.column else None
+        if rule.field not in standard_fields or column is None:
+            continue
+        rule.column = column
+        if rule.transform not in TRANSFORMS:
+            rule.transform = "strip"
+        if rule.pattern:
+            cells = sample[by_name[column]].dropna().astype(str).tolist()
+            pattern = _compile_pattern(rule.pattern, cells)
+            if pattern is None:
+                print(f"[INGESTION] Dropping mapping rule for {rule.field}: unusable pattern {rule.pattern!r}")
+                continue
+            rule.pattern = pattern
+        rules.append(rule)
+
+    if not any(r.field == "name" for r in rules):
+        return None
+    return MappingPlan(rules=rules)
+
+
+# -----------------------------------------------------------------------------
+# Application
+# -----------------------------------------------------------------------------
+def _apply_transform(values: pd.Series, transform: str) -> pd.Series:
+    values = values.str.replace(r"\s+", " ", regex=True).str.strip()
+    if transform == "title":
+        values = values.str.title()
+    elif transform == "name":
+        values = (
+            values.str.title()
+            .str.replace(r"\b(Md|Do|Np|Pa|Rn|Dds|Dmd|Dpm|Phd)\b", lambda m: m.group(1).upper(), regex=True)
+            .str.replace(r"^Dr\.?\s+", "Dr. ", regex=True)
+        )
+    elif transform == "upper":
+        values = values.str.upper()
+    elif transform in ("lower", "email"):
+        values = values.str.lower()
+    elif transform == "digits":
+        values = values.str.replace(r"\D", "", regex=True)
+    elif transform == "license":
+        values = values.str.upper().str.replace(r"[\s-]+", "", regex=True)
+    elif transform == "phone":
+        digits = values.str.replace(r"\D", "", regex=True)
+        values = pd.Series(pd.NA, index=values.index, dtype="object")
+        values = values.mask(digits.str.len() == 10, "+1" + digits)
+        values = values.mask((digits.str.len() == 11) & digits.str.startswith("1"), "+" + digits)
+    return values.replace("", pd.NA)
+
+
+def apply_plan(df: pd.DataFrame, plan: MappingPlan) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Returns (values, fits): one column per planned field, and a boolean mask of
+    rows where every planned field with source data produced a valid value.
+    """
+    by_name = {str(c): c for c in df.columns}
+    values = pd.DataFrame(index=df.index)
+    fits = pd.Series(True, index=df.index)
+
+    for rule in plan.rules:
+        raw = df[by_name[rule.column]]
+        has_source = raw.notna() & (raw.astype(str).str.strip() != "")
+        cells = raw.astype("string").fillna("")
+        if rule.pattern:
+            # Bounded input keeps a vetted pattern's backtracking bounded too
+            cells = cells.str.slice(0, PLAN_CELL_MAX_CHARS).str.extract(rule.pattern, expand=False).astype("string")
+        extracted = _apply_transform(cells.fillna(""), rule.transform)
+        if rule.field in FIELD_VALIDATORS:
+            extracted = extracted.where(extracted.fillna("").str.match(FIELD_VALIDATORS[rule.field]), pd.NA)
+
+        values[rule.field] = extracted
+        fits &= ~has_source | extracted.notna()
+
+    fits &= values["name"].notna()
+    return values, fits
+
+
+def plan_rows_to_providers(
+    values: pd.DataFrame, standard_fields: List[str], signature: str
+) -> List[Dict]:
+    providers = []
+    note = f"Extracted via mapping plan {signature}"
+    for index, row in zip(values.index, values.to_dict("records")):
+        fields = {f: (row.get(f) if pd.notna(row.get(f, pd.NA)) else None) for f in standard_fields}
+        providers.append({
+            **fields,
+            "confidence": {f: PLAN_CONFIDENCE if fields[f] is not None else 0.0 for f in standard_fields},
+            "ai_notes": [note],
+            "source_row": int(index) + 1,
+        })
+    return providers
@@ -0,0 +1,303 @@
+"""
+Deterministic pre-extraction for the ingestion service.
+- Pulls NPIs, phones, emails and license numbers out of raw cells with regex/phonenumbers
+- Takes name / specialty / address / id from recognised headers when the cell is clean
+- Flags a row for the LLM only when something in it is left unexplained
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import phonenumbers
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+DEFAULT_REGION = "US"
+
+# Confidence assigned to each kind of rule match
+CONFIDENCE = {
+    "provider_id": 1.0,
+    "email": 0.99,
+    "npi_labelled": 0.99,
+    "npi_bare": 0.9,
+    "phone": 0.97,
+    "license_labelled": 0.95,
+    "license_bare": 0.9,
+    "name": 0.95,
+    "specialty": 0.95,
+    "address": 0.9,
+}
+
+HEADER_SYNONYMS = {
+    "provider_id": ["provider id", "provider_id", "id", "provider number"],
+    "name": ["name", "provider name", "doctor name", "doctor", "full name", "physician", "provider"],
+    "specialty": ["specialty", "speciality", "specialization", "taxonomy", "primary specialty"],
+    "phone": ["phone", "phone number", "telephone", "tel", "contact number", "mobile"],
+    "email": ["email", "e-mail", "email address", "mail"],
+    "address": ["address", "street address", "practice address", "location", "office address"],
+    "npi_number": ["npi", "npi number", "npi_number", "npi no"],
+    "license_number": ["license", "license number", "license_number", "state license", "lic", "license no"],
+}
+
+SPECIALTIES = [
+    "Allergy & Immunology", "Anesthesiology", "Cardiology", "Chiropractic", "Dentistry",
+    "Dermatology", "Emergency Medicine", "Endocrinology", "Family Medicine", "Family Practice",
+    "Gastroenterology", "General Practice", "General Surgery", "Geriatric Medicine", "Hematology",
+    "Infectious Disease", "Internal Medicine", "Nephrology", "Neurology", "Nurse Practitioner",
+    "Obstetrics & Gynecology", "Oncology", "Ophthalmology", "Optometry", "Orthopedic Surgery",
+    "Orthopedics", "Otolaryngology", "Pathology", "Pediatrics", "Physical Medicine & Rehabilitation",
+    "Physician Assistant", "Plastic Surgery", "Podiatry", "Psychiatry", "Psychology", "Pulmonology",
+    "Radiology", "Rheumatology", "Urology",
+]
+
+NAME_PREFIXES = {"dr", "dr.", "mr", "mr.", "mrs", "mrs.", "ms", "ms.", "prof", "prof."}
+CREDENTIALS = {"md", "do", "np", "pa", "rn", "dds", "dmd", "dpm", "phd", "od", "pharmd", "pa-c", "aprn", "lcsw"}
+
+# Words that only label or glue extracted values together ("Phone: ... or ...")
+FILLER_WORDS = {
+    "npi", "phone", "tel", "telephone", "office", "mobile", "cell", "email", "e", "mail",
+    "license", "lic", "state", "number", "no", "is", "contact", "at", "or", "and", "her",
+    "his", "him", "them", "free", "text", "id", "the",
+}
+
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+NPI_LABELLED_RE = re.compile(r"\bNPI\b\s*(?:#|no\.?|number)?\s*:?\s*(?:is\s+)?(\d{10})\b", re.IGNORECASE)
+NPI_BARE_RE = re.compile(r"(?<![\d-])(\d{10})(?![\d-])")
+LICENSE_LABELLED_RE = re.compile(
+    r"\b(?:state\s+)?lic(?:ense)?\.?\s*(?:#|no\.?|number)?\s*:?\s*(?:is\s+)?#?([A-Z]{1,3}[- ]?\d{3,10})\b",
+    re.IGNORECASE,
+)
+LICENSE_BARE_RE = re.compile(r"\b([A-Z]{2})-(\d{4,8})\b")
+NAME_RE = re.compile(r"^[A-Za-z][A-Za-z.,'\- ]*$")
+ADDRESS_RE = re.compile(r"^\d+[A-Za-z]?\s+[A-Za-z0-9.,#'\- ]*[A-Za-z][A-Za-z0-9.,#'\- ]*$")
+
+_SPECIALTY_LOOKUP = {
+    re.sub(r"[^a-z]+", " ", s.lower().replace("&", " and ")).strip(): s for s in SPECIALTIES
+}
+
+
+# -----------------------------------------------------------------------------
+# Result container
+# -----------------------------------------------------------------------------
+@dataclass
+class RuleExtraction:
+    source_row: int
+    fields: Dict[str, str] = field(default_factory=dict)
+    confidence: Dict[str, float] = field(default_factory=dict)
+    needs_llm: bool = True
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def resolved_fields(self) -> List[str]:
+        return sorted(self.fields)
+
+    def set(self, name: str, value: str, confidence: float) -> None:
+        # Keep the first (highest-priority) match for a field
+        if name not in self.fields:
+            self.fields[name] = value
+            self.confidence[name] = confidence
+
+    def to_provider(self, standard_fields: List[str]) -> Dict[str, Any]:
+        """Builds a complete provider record for rows that never reach the LLM."""
+        return {
+            **{f: self.fields.get(f) for f in standard_fields},
+            "confidence": {f: self.confidence.get(f, 0.0) for f in standard_fields},
+            "ai_notes": [f"Rule-extracted: {', '.join(self.resolved_fields)}"] + self.notes,
+            "source_row": self.source_row,
+            "rule_resolved_fields": self.resolved_fields,
+        }
+
+    def apply_to(self, provider: Dict[str, Any]) -> Dict[str, Any]:
+        """Overlays rule-resolved fields onto an LLM-extracted provider."""
+        if not self.fields:
+            return provider
+        confidence = provider.get("confidence")
+        if not isinstance(confidence, dict):
+            confidence = provider["confidence"] = {}
+        for name, value in self.fields.items():
+            provider[name] = value
+            confidence[name] = self.confidence[name]
+        notes = provider.get("ai_notes")
+        if not isinstance(notes, list):
+            notes = provider["ai_notes"] = []
+        notes.append(f"Rule-extracted: {', '.join(self.resolved_fields)}")
+        provider["rule_resolved_fields"] = self.resolved_fields
+        return provider
+
+
+# -----------------------------------------------------------------------------
+# Normalizers
+# -----------------------------------------------------------------------------
+def is_valid_npi(npi: str) -> bool:
+    """NPI check digit: Luhn over the number prefixed with the 80840 issuer code."""
+    if len(npi) != 10 or not npi.isdigit() or npi[0] not in "12":
+        return False
+    total = 0
+    for i, ch in enumerate(reversed("80840" + npi)):
+        digit = int(ch)
+        if i % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def normalize_header(header: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(header).lower()).strip()
+
+
+def map_headers(columns: List[Any]) -> Dict[Any, str]:
+    """Maps source columns to STANDARD_FIELDS names where the header is unambiguous."""
+    mapping: Dict[Any, str] = {}
+    for column in columns:
+        header = normalize_header(column)
+        for field_name, synonyms in HEADER_SYNONYMS.items():
+            if header in (normalize_header(s) for s in synonyms):
+                mapping[column] = field_name
+                break
+    return mapping
+
+
+def normalize_name(text: str) -> Optional[str]:
+    text = " ".join(text.split())
+    if not NAME_RE.match(text) or " - " in text:
+        return None
+
+    words = []
+    for raw in text.replace(",", " , ").split():
+        low = raw.lower()
+        if raw == ",":
+            words.append(raw)
+        elif low in NAME_PREFIXES:
+            words.append(low.rstrip(".").capitalize() + ".")
+        elif low.rstrip(".") in CREDENTIALS:
+            words.append(raw.rstrip(".").upper())
+        else:
+            words.append("-".join(
+                "'".join(part.capitalize() for part in piece.split("'"))
+                for piece in raw.split("-")
+            ))
+
+    core = [w for w in words if w != "," and w.lower().rstrip(".") not in NAME_PREFIXES | CREDENTIALS]
+    if not 2 <= len(core) <= 4:
+        return None
+    return " ".join(words).replace(" , ", ", ")
+
+
+def normalize_specialty(text: str) -> Optional[str]:
+    key = re.sub(r"[^a-z]+", " ", text.lower().replace("&", " and ")).strip()
+    return _SPECIALTY_LOOKUP.get(key)
+
+
+def normalize_address(text: str) -> Optional[str]:
+    text = " ".join(text.split())
+    return text if ADDRESS_RE.match(text) else None
+
+
+def normalize_license(text: str) -> str:
+    return re.sub(r"[\s-]+", "", text).upper()
+
+
+# -----------------------------------------------------------------------------
+# Extraction
+# -----------------------------------------------------------------------------
+def _mask(text: str, spans: List[Tuple[int, int]]) -> str:
+    chars = list(text)
+    for start, end in spans:
+        chars[start:end] = " " * (end - start)
+    return "".join(chars)
+
+
+def _extract_entities(text: str, column_field: Optional[str], result: RuleExtraction) -> str:
+    """Finds pattern-shaped fields in one cell and returns the unexplained remainder."""
+    spans: List[Tuple[int, int]] = []
+
+    for m in EMAIL_RE.finditer(text):
+        result.set("email", m.group(0).lower(), CONFIDENCE["email"])
+        spans.append(m.span())
+
+    for m in NPI_LABELLED_RE.finditer(text):
+        result.set("npi_number", m.group(1), CONFIDENCE["npi_labelled"])
+        spans.append(m.span())
+
+    for m in LICENSE_LABELLED_RE.finditer(text):
+        result.set("license_number", normalize_license(m.group(1)), CONFIDENCE["license_labelled"])
+        spans.append(m.span())
+    for m in LICENSE_BARE_RE.finditer(_mask(text, spans)):
+        confidence = CONFIDENCE["license_labelled" if column_field == "license_number" else "license_bare"]
+        result.set("license_number", normalize_license(m.group(0)), confidence)
+        spans.append(m.span())
+
+    # An unformatted 10-digit run is an NPI when the header says so or the check digit holds
+    for m in NPI_BARE_RE.finditer(_mask(text, spans)):
+        if column_field == "npi_number":
+            result.set("npi_number", m.group(1), CONFIDENCE["npi_labelled"])
+            spans.append(m.span())
+        elif column_field != "phone" and is_valid_npi(m.group(1)):
+            result.set("npi_number", m.group(1), CONFIDENCE["npi_bare"])
+            spans.append(m.span())
+
+    masked = _mask(text, spans)
+    for m in phonenumbers.PhoneNumberMatcher(masked, DEFAULT_REGION, leniency=phonenumbers.Leniency.POSSIBLE):
+        result.set(
+            "phone",
+            phonenumbers.format_number(m.number, phonenumbers.PhoneNumberFormat.E164),
+            CONFIDENCE["phone"],
+        )
+        spans.append((m.start, m.end))
+
+    return _mask(text, spans)
+
+
+def _has_residual(text: str) -> bool:
+    words = re.findall(r"[A-Za-z0-9]+", text.lower())
+    return any(w not in FILLER_WORDS for w in words)
+
+
+def extract_row(row: Dict[Any, Any], source_row: int, header_map: Dict[Any, str]) -> RuleExtraction:
+    result = RuleExtraction(source_row=source_row)
+    residual = False
+
+    for column, value in row.items():
+        if value is None or (isinstance(value, float) and pd.isna(value)):
+            continue
+        text = str(value).strip()
+        if not text:
+            continue
+        column_field = header_map.get(column)
+
+        # Whole-cell fields only come from their own, clean column
+        if column_field in ("provider_id", "name", "specialty", "address"):
+            if column_field == "provider_id" and " " not in text:
+                normalized = text
+            elif column_field == "name":
+                normalized = normalize_name(text)
+            elif column_field == "specialty":
+                normalized = normalize_specialty(text)
+            elif column_field == "address":
+                normalized = normalize_address(text)
+            else:
+                normalized = None
+            if normalized:
+                result.set(column_field, normalized, CONFIDENCE[column_field])
+                continue
+
+        remainder = _extract_entities(text, column_field, result)
+        if _has_residual(remainder):
+            residual = True
+
+    result.needs_llm = residual or "name" not in result.fields
+    return result
+
+
+def extract_rows(df: pd.DataFrame) -> Dict[int, RuleExtraction]:
+    """Runs rule extraction over every row, keyed by 1-based source_row."""
+    header_map = map_headers(list(df.columns))
+    return {
+        int(index) + 1: extract_row(row, int(index) + 1, header_map)
+        for index, row in zip(df.index, df.to_dict("records"))
+    }
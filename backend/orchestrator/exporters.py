@@ -0,0 +1,176 @@
+"""
+Streaming exports of a job's merged cleaned + validated records.
+- One flat row per provider: cleaned fields, ingestion confidence, validation
+  verdict, confidence_scores.* and updated_fields.* columns, discrepancies and
+  notes joined into single cells
+- CSV and NDJSON are flushed every ~64 KB; Parquet one row group at a time
+  (pyarrow is optional and imported only for Parquet exports)
+- Input is any iterator of job store records, so memory stays bounded by one
+  page of records plus one row group
+"""
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+PROVIDER_FIELDS = [
+    "provider_id", "name", "specialty", "phone", "email", "address", "npi_number", "license_number",
+]
+SCORED_FIELDS = ["name", "specialty", "phone", "email", "address", "npi_number", "license_number"]
+PARQUET_ROW_GROUP = 5000
+LIST_SEPARATOR = "; "
+
+COLUMNS = (
+    ["source_row", "outcome", "error"]
+    + PROVIDER_FIELDS
+    + [f"ingestion_confidence.{f}" for f in PROVIDER_FIELDS]
+    + ["requires_manual_review", "discrepancy_count", "discrepancies", "validation_notes"]
+    + [f"confidence_scores.{f}" for f in SCORED_FIELDS + ["overall"]]
+    + [f"updated_fields.{f}" for f in PROVIDER_FIELDS]
+)
+FLOAT_COLUMNS = {c for c in COLUMNS if "confidence" in c}
+INT_COLUMNS = {"source_row", "discrepancy_count"}
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _join(values: Any) -> str:
+    if isinstance(values, list):
+        return LIST_SEPARATOR.join(str(v) for v in values)
+    return "" if values is None else str(values)
+
+
+def _number(value: Any) -> Any:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def flatten_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    cleaned = record.get("cleaned") or {}
+    validated = record.get("validated") or {}
+    ingestion_confidence = cleaned.get("confidence") or {}
+    scores = validated.get("confidence_scores") or {}
+    updated = validated.get("updated_fields") or {}
+    discrepancies = validated.get("discrepancies") or []
+
+    row: Dict[str, Any] = {
+        "source_row": record.get("row", cleaned.get("source_row")),
+        "outcome": record.get("outcome"),
+        "error": record.get("error"),
+    }
+    for f in PROVIDER_FIELDS:
+        row[f] = None if cleaned.get(f) is None else str(cleaned[f])
+        row[f"ingestion_confidence.{f}"] = _number(ingestion_confidence.get(f))
+        row[f"updated_fields.{f}"] = None if updated.get(f) is None else str(updated[f])
+    row["requires_manual_review"] = bool(validated.get("requires_manual_review"))
+    row["discrepancy_count"] = len(discrepancies) if isinstance(discrepancies, list) else 0
+    row["discrepancies"] = _join(discrepancies)
+    row["validation_notes"] = _join(validated.get("validation_notes"))
+    for f in SCORED_FIELDS + ["overall"]:
+        row[f"confidence_scores.{f}"] = _number(scores.get(f))
+    return row
+
+
+# -----------------------------------------------------------------------------
+# Writers
+# -----------------------------------------------------------------------------
+def export_csv(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        writer.writerow(flatten_record(record))
+        # Flush every ~64 KB rather than per row
+        if buffer.tell() >= 65536:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    lines: List[str] = []
+    size = 0
+    for record in records:
+        line = json.dumps(flatten_record(record), separators=(",", ":")) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= 65536:
+            yield "".join(lines).encode("utf-8")
+            lines, size = [], 0
+    yield "".join(lines).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each row group."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_parquet(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (c, pa.float64() if c in FLOAT_COLUMNS else pa.int64() if c in INT_COLUMNS
+         else pa.bool_() if c == "requires_manual_review" else pa.string())
+        for c in COLUMNS
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    def flush(rows: List[Dict[str, Any]]) -> bytes:
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        return sink.drain()
+
+    rows: List[Dict[str, Any]] = []
+    for record in records:
+        rows.append(flatten_record(record))
+        if len(rows) >= PARQUET_ROW_GROUP:
+            yield flush(rows)
+            rows = []
+    if rows:
+        yield flush(rows)
+    writer.close()
+    yield sink.drain()
+
+
+EXPORTERS = {
+    "csv": export_csv,
+    "ndjson": export_ndjson,
+    "parquet": export_parquet,
+}
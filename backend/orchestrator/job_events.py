@@ -0,0 +1,131 @@
+"""
+Job progress notifications for Server-Sent Events.
+- JobEvents wakes local watchers the moment this process writes a job
+- Watchers also re-read the job store every SSE_POLL_SECONDS, which covers
+  jobs run by another worker process
+- notify() may be called from the threads that write the job store
+- Events are small deltas (status, stage, progress, row counts, per-stage
+  throughput and ETA); the result itself is fetched separately from
+  /jobs/{job_id}/result
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "1.0"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15.0"))
+
+PROGRESS_FIELDS = ("status", "stage", "progress", "error")
+
+
+class JobEvents:
+    def __init__(self):
+        self._watchers: Dict[str, Set[asyncio.Event]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def notify(self, job_id: str) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a job store write on a worker thread
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._wake, job_id)
+            return
+        self._wake(job_id)
+
+    def _wake(self, job_id: str) -> None:
+        for event in self._watchers.get(job_id, ()):
+            event.set()
+
+    async def wait(self, event: asyncio.Event, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    def watch(self, job_id: str) -> asyncio.Event:
+        self._loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(event)
+        return event
+
+    def unwatch(self, job_id: str, event: asyncio.Event) -> None:
+        watchers = self._watchers.get(job_id)
+        if watchers is not None:
+            watchers.discard(event)
+            if not watchers:
+                del self._watchers[job_id]
+
+    def watcher_count(self) -> int:
+        return sum(len(w) for w in self._watchers.values())
+
+
+def progress_snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+    snapshot = {k: job.get(k) for k in PROGRESS_FIELDS}
+    snapshot.update(job.get("meta", {}).get("counts", {}))
+    if "stages" in job.get("meta", {}):
+        snapshot["stages"] = job["meta"]["stages"]
+    return snapshot
+
+
+def sse(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+async def job_event_stream(store: Any, events: JobEvents, job_id: str, is_disconnected) -> AsyncIterator[bytes]:
+    """
+    Emits `progress` whenever the snapshot changes, then one terminal event:
+    `completed` (summary + result URL) or `failed` (error).
+    """
+    event = events.watch(job_id)
+    last: Optional[Dict[str, Any]] = None
+    sequence = 0
+    last_sent = time.monotonic()
+    try:
+        # Tell EventSource to reconnect quickly if the connection drops
+        yield b"retry: 2000\n\n"
+        while True:
+            job = await asyncio.to_thread(store.get, job_id)
+            if job is None:
+                yield sse("failed", {"error": "Job not found"})
+                return
+
+            snapshot = progress_snapshot(job)
+            if snapshot != last:
+                # Only the fields that changed since the previous event
+                delta = snapshot if last is None else {k: v for k, v in snapshot.items() if last.get(k) != v}
+                sequence += 1
+                yield sse("progress", delta, sequence)
+                last, last_sent = snapshot, time.monotonic()
+
+            if job["status"] == "completed":
+                yield sse("completed", {
+                    "job_id": job_id,
+                    "summary": job.get("summary"),
+                    "record_count": job.get("record_count"),
+                    "result_url": f"/jobs/{job_id}/result",
+                }, sequence + 1)
+                return
+            if job["status"] == "failed":
+                yield sse("failed", {"job_id": job_id, "error": job.get("error")}, sequence + 1)
+                return
+
+            if await is_disconnected():
+                return
+            await events.wait(event, SSE_POLL_SECONDS)
+            if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                yield b": keepalive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        events.unwatch(job_id, event)
@@ -0,0 +1,812 @@
+"""
+Job store for the orchestrator.
+- Job metadata (status, stage, progress, error, summary) is a small row per job
+- Results are stored one record per provider (zlib-compressed cleaned +
+  validated pair), appended as validation batches complete
+- Finished jobs expire after JOB_TTL_SECONDS; the oldest finished jobs are
+  evicted once stored results exceed JOB_STORE_MAX_BYTES
+- "sqlite" (default, WAL, shared by every worker process on the host) or
+  "memory" (single process, still bounded)
+- `on_change(job_id)` fires after every write made by this process
+- Jobs may carry a content hash; create_or_get() attaches identical
+  submissions to the existing job atomically. Failed jobs and partial
+  completions (some providers errored) are never reused, so a re-upload
+  retries them
+- The run queue (priority, submitter, run arguments) lives here too, so
+  queued jobs survive restarts and every worker process claims from it
+- Methods block on SQLite; async callers run them with asyncio.to_thread, so
+  on_change may fire on a worker thread
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "sqlite").lower()
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(os.path.dirname(__file__), ".jobs.sqlite3"))
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+JOB_STORE_MAX_BYTES = int(os.getenv("JOB_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+FINISHED_STATUSES = ("completed", "failed")
+JOB_FIELDS = ("status", "stage", "progress", "error")
+PAGE_SIZE = 500
+
+
+@dataclass
+class RecordFilter:
+    requires_manual_review: Optional[bool] = None
+    # Keeps records whose lowest confidence score is below this
+    max_confidence: Optional[float] = None
+    outcome: Optional[str] = None
+
+    def matches(self, requires_manual_review: int, min_conf: Optional[float], outcome: str) -> bool:
+        if self.requires_manual_review is not None and bool(requires_manual_review) != self.requires_manual_review:
+            return False
+        if self.max_confidence is not None and (min_conf is None or min_conf >= self.max_confidence):
+            return False
+        return self.outcome is None or outcome == self.outcome
+
+
+def encode_record(cleaned: dict, validated: Optional[dict]) -> bytes:
+    return zlib.compress(json.dumps([cleaned, validated], separators=(",", ":")).encode("utf-8"))
+
+
+def decode_record(blob: bytes) -> Tuple[dict, Optional[dict]]:
+    cleaned, validated = json.loads(zlib.decompress(blob))
+    return cleaned, validated
+
+
+def min_confidence(validated: Optional[dict]) -> Optional[float]:
+    scores = [v for v in ((validated or {}).get("confidence_scores") or {}).values() if isinstance(v, (int, float))]
+    return min(scores) if scores else None
+
+
+def _record_row(job_id: str, seq: int, cleaned: dict, validated: Optional[dict], outcome: str, error: Optional[str]):
+    blob = encode_record(cleaned, validated)
+    return (
+        job_id, seq, int(cleaned.get("source_row") or 0), outcome, error,
+        int(bool((validated or {}).get("requires_manual_review"))), min_confidence(validated),
+        blob, len(blob),
+    )
+
+
+def _queue_counts(rows: Iterable[Tuple[int, Any, int]]) -> Dict[str, int]:
+    """(priority, claimed, count) rows -> queued/running totals plus queued per priority."""
+    counts = {"queued": 0, "running": 0}
+    for priority, claimed, n in rows:
+        if claimed:
+            counts["running"] += n
+        else:
+            counts["queued"] += n
+            counts[f"queued_p{priority}"] = counts.get(f"queued_p{priority}", 0) + n
+    return counts
+
+
+# -----------------------------------------------------------------------------
+# Interface
+# -----------------------------------------------------------------------------
+class JobStore(ABC):
+    on_change: Optional[Callable[[str], None]] = None
+
+    def _changed(self, job_id: str) -> None:
+        if self.on_change is not None:
+            self.on_change(job_id)
+
+    @abstractmethod
+    def create(self, job_id: str, **fields: Any) -> None:
+        ...
+
+    @abstractmethod
+    def create_or_get(self, job_id: str, content_hash: str, **fields: Any) -> Tuple[str, bool]:
+        """
+        Creates the job unless a reusable job (see find_by_hash) with the same
+        content hash exists; returns (job_id, created).
+        """
+
+    @abstractmethod
+    def find_by_hash(self, content_hash: str) -> Optional[str]:
+        """Newest job with this content hash that is in flight or completed without errors."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job metadata only; never loads results."""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields: Any) -> None:
+        """Sets status/stage/progress/error; any other keys are merged into `meta`."""
+
+    @abstractmethod
+    def append_records(self, job_id: str, records: Iterable[Tuple[dict, Optional[dict], str, Optional[str]]]) -> None:
+        """Appends (cleaned, validated, outcome, error) tuples in arrival order."""
+
+    @abstractmethod
+    def page_records(
+        self,
+        job_id: str,
+        after: Tuple[int, int] = (-1, -1),
+        limit: int = PAGE_SIZE,
+        filters: Optional[RecordFilter] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Up to `limit` records as {seq, row, outcome, error, cleaned, validated},
+        ordered by (row, seq) and strictly after the `after` key.
+        """
+
+    def iter_records(self, job_id: str, filters: Optional[RecordFilter] = None) -> Iterator[Dict[str, Any]]:
+        """Every matching record in source_row order, one page in memory at a time."""
+        after = (-1, -1)
+        while True:
+            page = self.page_records(job_id, after, PAGE_SIZE, filters)
+            yield from page
+            if len(page) < PAGE_SIZE:
+                return
+            after = (page[-1]["row"], page[-1]["seq"])
+
+    @abstractmethod
+    def finish(self, job_id: str, summary: Dict[str, Any]) -> None:
+        ...
+
+    # Run queue -----------------------------------------------------------
+    @abstractmethod
+    def enqueue(self, job_id: str, priority: int, submitter: str, payload: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def claim(self, max_priority: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Claims the next queued job with priority <= max_priority: lowest
+        priority value first, then the submitter with the fewest running
+        jobs, then the oldest. Returns (job_id, payload) or None.
+        """
+
+    @abstractmethod
+    def release(self, job_id: str) -> None:
+        """Drops the job from the queue once its run has ended."""
+
+    @abstractmethod
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position among unclaimed jobs, or None if not queued."""
+
+    @abstractmethod
+    def queue_counts(self, submitter: Optional[str] = None) -> Dict[str, int]:
+        """Queued and running totals plus queued per priority, optionally for one submitter."""
+
+    @abstractmethod
+    def heartbeat(self, job_ids: Iterable[str]) -> None:
+        """Marks the claims on these jobs as still held by a live worker."""
+
+    @abstractmethod
+    def reap_claims(self, max_idle_seconds: float, max_attempts: int) -> Tuple[List[str], List[str]]:
+        """
+        Handles claims with no heartbeat for max_idle_seconds (their worker
+        died). Jobs claimed fewer than max_attempts times go back in the queue
+        at their original place, with the records of the lost run dropped;
+        the rest are removed. Returns (requeued, abandoned) job ids.
+        """
+
+    @abstractmethod
+    def count_by_status(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def evict(self) -> int:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Reassembles the full final_result dict of a completed job."""
+        job = self.get(job_id)
+        if not job or job["status"] != "completed":
+            return None
+        cleaned, validated, failed = [], [], []
+        for index, record in enumerate(self.iter_records(job_id)):
+            cleaned.append(record["cleaned"])
+            validated.append(record["validated"])
+            if record["outcome"] == "error":
+                failed.append({"index": index, "source_row": record["row"], "status": "error", "error": record["error"]})
+        summary = job.get("summary") or {}
+        return {
+            "status": summary.get("status", "success"),
+            "cleaned_count": len(cleaned),
+            "validated_count": len(validated) - len(failed),
+            "cleaned_providers": cleaned,
+            "validated_providers": validated,
+            "results": validated,
+            "validation_outcomes": summary.get("validation_outcomes", {}),
+            "llm_routing": summary.get("llm_routing", {}),
+            "failed_providers": failed,
+        }
+
+
+# -----------------------------------------------------------------------------
+# SQLite
+# -----------------------------------------------------------------------------
+class SQLiteJobStore(JobStore):
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn: Optional[sqlite3.Connection] = None
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    meta TEXT NOT NULL DEFAULT '{}',
+                    summary TEXT,
+                    result_bytes INTEGER NOT NULL DEFAULT 0,
+                    record_count INTEGER NOT NULL DEFAULT 0,
+                    content_hash TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(jobs)")}
+            if "content_hash" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs(status, updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_content_hash ON jobs(content_hash, created_at)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS job_queue (
+                    job_id TEXT PRIMARY KEY,
+                    priority INTEGER NOT NULL,
+                    submitter TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    claimed_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            queue_columns = {r[1] for r in conn.execute("PRAGMA table_info(job_queue)")}
+            if "attempts" not in queue_columns:
+                conn.execute("ALTER TABLE job_queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_order ON job_queue(claimed_at, priority, enqueued_at)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS job_records (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    row INTEGER NOT NULL,
+                    outcome TEXT NOT NULL,
+                    error TEXT,
+                    requires_manual_review INTEGER NOT NULL,
+                    min_confidence REAL,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_records_row ON job_records(job_id, row, seq)")
+            conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per process; reopened after a fork (uvicorn --workers)
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._conn
+
+    def _insert(self, conn: sqlite3.Connection, job_id: str, content_hash: Optional[str], fields: Dict[str, Any]) -> None:
+        now = time.time()
+        meta = {k: v for k, v in fields.items() if k not in JOB_FIELDS}
+        conn.execute(
+            """INSERT INTO jobs (job_id, status, stage, progress, error, meta, content_hash, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job_id, fields.get("status", "pending"), fields.get("stage", "upload"),
+             fields.get("progress", 0), fields.get("error"), json.dumps(meta), content_hash, now, now),
+        )
+
+    def create(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            conn = self._connection()
+            self._insert(conn, job_id, None, fields)
+            conn.commit()
+
+    def create_or_get(self, job_id: str, content_hash: str, **fields: Any) -> Tuple[str, bool]:
+        with self._lock:
+            conn = self._connection()
+            # IMMEDIATE takes the write lock up front, so concurrent workers serialize here
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._find_by_hash(conn, content_hash)
+                if existing is None:
+                    self._insert(conn, job_id, content_hash, fields)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if existing is not None:
+            return existing, False
+        return job_id, True
+
+    def _find_by_hash(self, conn: sqlite3.Connection, content_hash: str) -> Optional[str]:
+        row = conn.execute(
+            """SELECT job_id FROM jobs
+               WHERE content_hash = ? AND status != 'failed'
+                 AND NOT (status = 'completed' AND COALESCE(json_extract(summary, '$.status'), 'success') != 'success')
+               ORDER BY created_at DESC LIMIT 1""",
+            (content_hash,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[str]:
+        with self._lock:
+            return self._find_by_hash(self._connection(), content_hash)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute(
+                """SELECT job_id, status, stage, progress, error, meta, summary, record_count,
+                          result_bytes, created_at, updated_at
+                   FROM jobs WHERE job_id = ?""",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0], "status": row[1], "stage": row[2], "progress": row[3], "error": row[4],
+            "meta": json.loads(row[5]), "summary": json.loads(row[6]) if row[6] else None,
+            "record_count": row[7], "result_bytes": row[8], "created_at": row[9], "updated_at": row[10],
+        }
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        columns = {k: v for k, v in fields.items() if k in JOB_FIELDS}
+        extra = {k: v for k, v in fields.items() if k not in JOB_FIELDS}
+        sets = [f"{k} = ?" for k in columns] + ["updated_at = ?"]
+        params: List[Any] = list(columns.values()) + [time.time()]
+        if extra:
+            sets.append("meta = json_patch(meta, ?)")
+            params.append(json.dumps(extra))
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"UPDATE jobs SET {', '.join(sets)} WHERE job_id = ?", (*params, job_id))
+            conn.commit()
+        self._changed(job_id)
+
+    def append_records(self, job_id: str, records: Iterable[Tuple[dict, Optional[dict], str, Optional[str]]]) -> None:
+        with self._lock:
+            conn = self._connection()
+            start = conn.execute("SELECT record_count FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+            rows = [_record_row(job_id, start + i, *record) for i, record in enumerate(records)]
+            conn.executemany(
+                """INSERT INTO job_records
+                   (job_id, seq, row, outcome, error, requires_manual_review, min_confidence, data, size)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows,
+            )
+            conn.execute(
+                "UPDATE jobs SET record_count = record_count + ?, result_bytes = result_bytes + ?, updated_at = ? WHERE job_id = ?",
+                (len(rows), sum(r[-1] for r in rows), time.time(), job_id),
+            )
+            conn.commit()
+        self._changed(job_id)
+
+    def page_records(
+        self,
+        job_id: str,
+        after: Tuple[int, int] = (-1, -1),
+        limit: int = PAGE_SIZE,
+        filters: Optional[RecordFilter] = None,
+    ) -> List[Dict[str, Any]]:
+        where = ["job_id = ?", "(row, seq) > (?, ?)"]
+        params: List[Any] = [job_id, *after]
+        if filters and filters.requires_manual_review is not None:
+            where.append("requires_manual_review = ?")
+            params.append(int(filters.requires_manual_review))
+        if filters and filters.max_confidence is not None:
+            where.append("min_confidence < ?")
+            params.append(filters.max_confidence)
+        if filters and filters.outcome:
+            where.append("outcome = ?")
+            params.append(filters.outcome)
+        with self._lock:
+            rows = self._connection().execute(
+                f"""SELECT seq, row, outcome, error, data FROM job_records
+                    WHERE {" AND ".join(where)} ORDER BY row, seq LIMIT ?""",
+                (*params, limit),
+            ).fetchall()
+        records = []
+        for seq, row, outcome, error, data in rows:
+            cleaned, validated = decode_record(data)
+            records.append({"seq": seq, "row": row, "outcome": outcome, "error": error, "cleaned": cleaned, "validated": validated})
+        return records
+
+    def finish(self, job_id: str, summary: Dict[str, Any]) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE jobs SET status = 'completed', stage = 'finished', progress = 100, summary = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(summary), time.time(), job_id),
+            )
+            conn.commit()
+        self._changed(job_id)
+        self.evict()
+
+    def enqueue(self, job_id: str, priority: int, submitter: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO job_queue (job_id, priority, submitter, payload, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, priority, submitter, json.dumps(payload), time.time()),
+            )
+            conn.commit()
+
+    def claim(self, max_priority: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            conn = self._connection()
+            # Other worker processes claim from the same table
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    """SELECT q.job_id, q.payload FROM job_queue q
+                       WHERE q.claimed_at IS NULL AND q.priority <= ?
+                       ORDER BY q.priority,
+                                (SELECT COUNT(*) FROM job_queue r
+                                 WHERE r.submitter = q.submitter AND r.claimed_at IS NOT NULL),
+                                q.enqueued_at
+                       LIMIT 1""",
+                    (max_priority,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE job_queue SET claimed_at = ?, attempts = attempts + 1 WHERE job_id = ?",
+                        (time.time(), row[0]),
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return (row[0], json.loads(row[1])) if row else None
+
+    def release(self, job_id: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+            conn.commit()
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._connection().execute(
+                """SELECT (SELECT COUNT(*) FROM job_queue a
+                           WHERE a.claimed_at IS NULL
+                             AND (a.priority < q.priority OR (a.priority = q.priority AND a.enqueued_at < q.enqueued_at)))
+                   FROM job_queue q WHERE q.job_id = ? AND q.claimed_at IS NULL""",
+                (job_id,),
+            ).fetchone()
+        return row[0] + 1 if row else None
+
+    def queue_counts(self, submitter: Optional[str] = None) -> Dict[str, int]:
+        where, params = ("WHERE submitter = ?", (submitter,)) if submitter is not None else ("", ())
+        with self._lock:
+            rows = self._connection().execute(
+                f"""SELECT priority, claimed_at IS NOT NULL, COUNT(*) FROM job_queue {where}
+                    GROUP BY priority, claimed_at IS NOT NULL""",
+                params,
+            ).fetchall()
+        return _queue_counts(rows)
+
+    def heartbeat(self, job_ids: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE job_queue SET claimed_at = ? WHERE job_id = ? AND claimed_at IS NOT NULL",
+                [(now, job_id) for job_id in job_ids],
+            )
+            conn.commit()
+
+    def reap_claims(self, max_idle_seconds: float, max_attempts: int) -> Tuple[List[str], List[str]]:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = conn.execute(
+                    "SELECT job_id, attempts FROM job_queue WHERE claimed_at IS NOT NULL AND claimed_at < ?",
+                    (time.time() - max_idle_seconds,),
+                ).fetchall()
+                requeued = [job_id for job_id, attempts in stale if attempts < max_attempts]
+                abandoned = [job_id for job_id, attempts in stale if attempts >= max_attempts]
+                for job_id in requeued:
+                    conn.execute("UPDATE job_queue SET claimed_at = NULL WHERE job_id = ?", (job_id,))
+                    conn.execute("DELETE FROM job_records WHERE job_id = ?", (job_id,))
+                    conn.execute("UPDATE jobs SET record_count = 0, result_bytes = 0 WHERE job_id = ?", (job_id,))
+                conn.executemany("DELETE FROM job_queue WHERE job_id = ?", [(j,) for j in abandoned])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return requeued, abandoned
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def evict(self) -> int:
+        now = time.time()
+        finished = ",".join(f"'{s}'" for s in FINISHED_STATUSES)
+        with self._lock:
+            conn = self._connection()
+            expired = [r[0] for r in conn.execute(
+                f"SELECT job_id FROM jobs WHERE status IN ({finished}) AND updated_at < ?",
+                (now - self.ttl_seconds,),
+            )]
+            # Keep the most recently finished jobs whose running size fits the budget
+            over_budget = [r[0] for r in conn.execute(
+                f"""SELECT job_id FROM (
+                        SELECT job_id, SUM(result_bytes) OVER (ORDER BY updated_at DESC, job_id) AS running
+                        FROM jobs WHERE status IN ({finished})
+                    ) WHERE running > ?""",
+                (self.max_bytes,),
+            )]
+            victims = list(set(expired) | set(over_budget))
+            for job_id in victims:
+                conn.execute("DELETE FROM job_records WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            conn.commit()
+        self.evictions += len(victims)
+        return len(victims)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs, total = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(result_bytes), 0) FROM jobs"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "jobs": jobs,
+            "result_bytes": total,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+# -----------------------------------------------------------------------------
+# Memory
+# -----------------------------------------------------------------------------
+class MemoryJobStore(JobStore):
+    """Single-process store with the same bounds; for tests and local runs."""
+
+    def __init__(self, ttl_seconds: float, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._records: Dict[str, List[tuple]] = {}
+        self._queue: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            self._create(job_id, None, fields)
+
+    def create_or_get(self, job_id: str, content_hash: str, **fields: Any) -> Tuple[str, bool]:
+        with self._lock:
+            existing = self._find_by_hash(content_hash)
+            if existing is not None:
+                return existing, False
+            self._create(job_id, content_hash, fields)
+        return job_id, True
+
+    def _find_by_hash(self, content_hash: str) -> Optional[str]:
+        matches = [
+            j for j in self._jobs.values()
+            if j["content_hash"] == content_hash and j["status"] != "failed"
+            and not (j["status"] == "completed" and (j["summary"] or {}).get("status", "success") != "success")
+        ]
+        return max(matches, key=lambda j: j["created_at"])["job_id"] if matches else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[str]:
+        with self._lock:
+            return self._find_by_hash(content_hash)
+
+    def _create(self, job_id: str, content_hash: Optional[str], fields: Dict[str, Any]) -> None:
+        now = time.time()
+        self._jobs[job_id] = {
+            "job_id": job_id, "status": fields.get("status", "pending"), "stage": fields.get("stage", "upload"),
+            "progress": fields.get("progress", 0), "error": fields.get("error"),
+            "meta": {k: v for k, v in fields.items() if k not in JOB_FIELDS}, "summary": None,
+            "record_count": 0, "result_bytes": 0, "content_hash": content_hash,
+            "created_at": now, "updated_at": now,
+        }
+        self._records[job_id] = []
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, meta=dict(job["meta"])) if job else None
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for key, value in fields.items():
+                if key in JOB_FIELDS:
+                    job[key] = value
+                else:
+                    job["meta"][key] = value
+            job["updated_at"] = time.time()
+        self._changed(job_id)
+
+    def append_records(self, job_id: str, records: Iterable[Tuple[dict, Optional[dict], str, Optional[str]]]) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            stored = self._records[job_id]
+            for record in records:
+                row = _record_row(job_id, len(stored), *record)
+                stored.append(row)
+                job["result_bytes"] += row[-1]
+            job["record_count"] = len(stored)
+            job["updated_at"] = time.time()
+        self._changed(job_id)
+
+    def page_records(
+        self,
+        job_id: str,
+        after: Tuple[int, int] = (-1, -1),
+        limit: int = PAGE_SIZE,
+        filters: Optional[RecordFilter] = None,
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = sorted(
+                (r for r in self._records.get(job_id, []) if (r[2], r[1]) > tuple(after)),
+                key=lambda r: (r[2], r[1]),
+            )
+        records = []
+        for _, seq, row, outcome, error, manual, min_conf, data, _ in rows:
+            if filters and not filters.matches(manual, min_conf, outcome):
+                continue
+            cleaned, validated = decode_record(data)
+            records.append({"seq": seq, "row": row, "outcome": outcome, "error": error, "cleaned": cleaned, "validated": validated})
+            if len(records) >= limit:
+                break
+        return records
+
+    def finish(self, job_id: str, summary: Dict[str, Any]) -> None:
+        with self._lock:
+            self._jobs[job_id]["summary"] = summary
+        self.update(job_id, status="completed", stage="finished", progress=100)
+        self.evict()
+
+    def enqueue(self, job_id: str, priority: int, submitter: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            self._queue[job_id] = {
+                "job_id": job_id, "priority": priority, "submitter": submitter, "payload": payload,
+                "enqueued_at": time.time(), "claimed_at": None, "attempts": 0,
+            }
+
+    def claim(self, max_priority: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            running: Dict[str, int] = {}
+            for entry in self._queue.values():
+                if entry["claimed_at"] is not None:
+                    running[entry["submitter"]] = running.get(entry["submitter"], 0) + 1
+            waiting = [e for e in self._queue.values() if e["claimed_at"] is None and e["priority"] <= max_priority]
+            if not waiting:
+                return None
+            entry = min(waiting, key=lambda e: (e["priority"], running.get(e["submitter"], 0), e["enqueued_at"]))
+            entry["claimed_at"] = time.time()
+            entry["attempts"] += 1
+            return entry["job_id"], entry["payload"]
+
+    def release(self, job_id: str) -> None:
+        with self._lock:
+            self._queue.pop(job_id, None)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._queue.get(job_id)
+            if entry is None or entry["claimed_at"] is not None:
+                return None
+            key = (entry["priority"], entry["enqueued_at"])
+            return 1 + sum(
+                1 for e in self._queue.values()
+                if e["claimed_at"] is None and (e["priority"], e["enqueued_at"]) < key
+            )
+
+    def queue_counts(self, submitter: Optional[str] = None) -> Dict[str, int]:
+        grouped: Dict[Tuple[int, bool], int] = {}
+        with self._lock:
+            for e in self._queue.values():
+                if submitter is None or e["submitter"] == submitter:
+                    key = (e["priority"], e["claimed_at"] is not None)
+                    grouped[key] = grouped.get(key, 0) + 1
+        return _queue_counts((p, claimed, n) for (p, claimed), n in grouped.items())
+
+    def heartbeat(self, job_ids: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock:
+            for job_id in job_ids:
+                entry = self._queue.get(job_id)
+                if entry is not None and entry["claimed_at"] is not None:
+                    entry["claimed_at"] = now
+
+    def reap_claims(self, max_idle_seconds: float, max_attempts: int) -> Tuple[List[str], List[str]]:
+        cutoff = time.time() - max_idle_seconds
+        requeued: List[str] = []
+        abandoned: List[str] = []
+        with self._lock:
+            for job_id, e in list(self._queue.items()):
+                if e["claimed_at"] is None or e["claimed_at"] >= cutoff:
+                    continue
+                if e["attempts"] < max_attempts:
+                    e["claimed_at"] = None
+                    requeued.append(job_id)
+                    if job_id in self._jobs:
+                        self._records[job_id] = []
+                        self._jobs[job_id].update(record_count=0, result_bytes=0)
+                else:
+                    del self._queue[job_id]
+                    abandoned.append(job_id)
+        return requeued, abandoned
+
+    def count_by_status(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    def evict(self) -> int:
+        now = time.time()
+        with self._lock:
+            finished = sorted(
+                (j for j in self._jobs.values() if j["status"] in FINISHED_STATUSES),
+                key=lambda j: j["updated_at"], reverse=True,
+            )
+            victims, running = [], 0
+            for job in finished:
+                running += job["result_bytes"]
+                if running > self.max_bytes or job["updated_at"] < now - self.ttl_seconds:
+                    victims.append(job["job_id"])
+            for job_id in victims:
+                self._jobs.pop(job_id, None)
+                self._records.pop(job_id, None)
+                self._queue.pop(job_id, None)
+        self.evictions += len(victims)
+        return len(victims)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(j["result_bytes"] for j in self._jobs.values())
+            jobs = len(self._jobs)
+        return {"backend": "memory", "jobs": jobs, "result_bytes": total, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            if JOB_STORE_BACKEND == "memory":
+                _store = MemoryJobStore(JOB_TTL_SECONDS, JOB_STORE_MAX_BYTES)
+            elif JOB_STORE_BACKEND == "sqlite":
+                _store = SQLiteJobStore(JOB_STORE_PATH, JOB_TTL_SECONDS, JOB_STORE_MAX_BYTES)
+            else:
+                raise ValueError(f"Unsupported JOB_STORE_BACKEND: {JOB_STORE_BACKEND}")
+    return _store
@@ -1,32 +1,111 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-import requests
+import httpx
 import uvicorn
+import os
+import json
+import gzip
+import base64
+import hashlib
+import asyncio
 import secrets
+import tempfile
+import time
 import typing
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
 # Load env vars
 load_dotenv(encoding="utf-8-sig")
 
 # --- REFACTOR: Import Config from local ---
 from config import INGESTION_BASE_URL, VALIDATION_BASE_URL, get_service_url
+from job_store import get_job_store, RecordFilter
+from job_events import JobEvents, job_event_stream
+from exporters import EXPORTERS, MEDIA_TYPES, parquet_available
+from scheduler import Scheduler
+from progress import JobProgress
+from npi_prefetch import NPIScanner, start_prefetch, NPI_PREFETCH_ENABLED
 
 # Construct URLs
-INGESTION_URL = get_service_url(INGESTION_BASE_URL, "ingest/csv")
+INGESTION_STREAM_URL = get_service_url(INGESTION_BASE_URL, "ingest/csv/stream")
 VALIDATION_URL = get_service_url(VALIDATION_BASE_URL, "validate")
+NPI_PREFETCH_URL = get_service_url(VALIDATION_BASE_URL, "npi/prefetch")
+SERVICE_CONFIG_URLS = {
+    "ingestion": get_service_url(INGESTION_BASE_URL, "config"),
+    "validation": get_service_url(VALIDATION_BASE_URL, "config"),
+}
+
+# Validation requests outstanding while ingestion is still streaming
+VALIDATION_MAX_IN_FLIGHT = int(os.getenv("VALIDATION_MAX_IN_FLIGHT", "4"))
+# Providers whose validation errored are re-sent up to this many times
+VALIDATION_RESUBMIT_ROUNDS = int(os.getenv("VALIDATION_RESUBMIT_ROUNDS", "2"))
+
+# Pipeline workers; further jobs wait in the scheduler queue as "pending"
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+# Uploads are spooled here in chunks instead of being held in memory
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or tempfile.gettempdir()
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Timeouts grow with the job: ingestion by upload size, validation by batch size
+INGESTION_TIMEOUT_BASE_SECONDS = float(os.getenv("INGESTION_TIMEOUT_BASE_SECONDS", "120"))
+TIMEOUT_SECONDS_PER_MB = float(os.getenv("TIMEOUT_SECONDS_PER_MB", "30"))
+VALIDATION_TIMEOUT_BASE_SECONDS = float(os.getenv("VALIDATION_TIMEOUT_BASE_SECONDS", "120"))
+VALIDATION_SECONDS_PER_PROVIDER = float(os.getenv("VALIDATION_SECONDS_PER_PROVIDER", "2"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+# End-to-end budget for one job, forwarded to each service as X-Deadline-Ms
+# (milliseconds remaining); the services shrink their own retries to fit it
+JOB_DEADLINE_BASE_SECONDS = float(os.getenv("JOB_DEADLINE_BASE_SECONDS", "900"))
+JOB_DEADLINE_SECONDS_PER_MB = float(os.getenv("JOB_DEADLINE_SECONDS_PER_MB", "600"))
+DEADLINE_HEADER = "X-Deadline-Ms"
+# A validation call is not started with less than this left in the job budget
+MIN_CALL_BUDGET_SECONDS = 5.0
+# /jobs/{job_id}/results: bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
+# Identical uploads under the same pipeline configuration reuse one job. The
+# configuration is what each service reports on /config (these fields), since
+# models and routing are set in the services' own .env files. Bump
+# PIPELINE_VERSION here or in a service when prompts or cleaning rules change.
+PIPELINE_VERSION = os.getenv("PIPELINE_VERSION", "1")
+PIPELINE_CONFIG_FIELDS = ("version", "pipeline_version", "llm_provider", "llm_routing")
+# Service configs are re-read this often; a failed read skips dedupe for that upload
+PIPELINE_CONFIG_TTL_SECONDS = float(os.getenv("PIPELINE_CONFIG_TTL_SECONDS", "30"))
 
-# Simple in-memory job store
-JOBS = {}
+HTTP: typing.Optional[httpx.AsyncClient] = None
+
+# Job metadata and results live in the job store (SQLite by default), not in process memory
+JOBS = get_job_store()
+EVENTS = JobEvents()
+JOBS.on_change = EVENTS.notify
+SCHEDULER = Scheduler(JOBS, MAX_CONCURRENT_JOBS)
 
 # -----------------------------------------------------------------------------
 # FastAPI App
 # -----------------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    JOBS.evict()
+    SCHEDULER.start(process_pipeline_task)
+    yield
+    await SCHEDULER.stop()
+    global HTTP
+    if HTTP is not None:
+        await HTTP.aclose()
+        HTTP = None
+
+
 app = FastAPI(
     title="Valid8 Orchestrator",
     description="Orchestrates the flow: CSV Upload -> Ingestion (Cleaning) -> Validation (NPI Check) -> Response",
-    version="1.2.0"
+    version="1.2.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -45,6 +124,18 @@ class JobResponse(BaseModel):
     job_id: str
     status: str
     message: str
+    deduplicated: bool = False
+    queue_position: typing.Optional[int] = None
+    estimated_wait_seconds: typing.Optional[float] = None
+
+class StageStatus(BaseModel):
+    rows_done: int = 0
+    rows_total: int = 0
+    rows_per_second: typing.Optional[float] = None
+    eta_seconds: typing.Optional[float] = None
+    started_at: typing.Optional[float] = None
+    updated_at: typing.Optional[float] = None   # last time the stage moved
+    finished: bool = False
 
 class JobStatus(BaseModel):
     job_id: str
@@ -53,89 +144,393 @@ class JobStatus(BaseModel):
     progress: int    # 0-100
     error: typing.Optional[str] = None
     result: typing.Optional[dict] = None
+    rows_done: int = 0       # providers validated
+    rows_total: int = 0      # source rows in the upload
+    eta_seconds: typing.Optional[float] = None
+    stages: typing.Dict[str, StageStatus] = {}
+    queue_position: typing.Optional[int] = None
+    estimated_wait_seconds: typing.Optional[float] = None
+    # Per stage: LLM results per model tier and the share escalated from fast to strong
+    llm_routing: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
 
 
 # -----------------------------------------------------------------------------
-# Background Task Logic
+# Helpers
 # -----------------------------------------------------------------------------
-def process_pipeline_task(job_id: str, file_name: str, file_content: bytes, content_type: str):
+def http_client() -> httpx.AsyncClient:
+    global HTTP
+    if HTTP is None:
+        HTTP = httpx.AsyncClient(
+            timeout=httpx.Timeout(INGESTION_TIMEOUT_BASE_SECONDS, connect=10.0),
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+        )
+    return HTTP
+
+
+def ingestion_timeout(size_bytes: int) -> httpx.Timeout:
+    # Read timeout is per chunk of the NDJSON stream; the first batch waits on CSV parsing and plan/rules
+    seconds = INGESTION_TIMEOUT_BASE_SECONDS + TIMEOUT_SECONDS_PER_MB * size_bytes / (1024 * 1024)
+    return httpx.Timeout(seconds, connect=10.0)
+
+
+def validation_seconds(provider_count: int) -> float:
+    return VALIDATION_TIMEOUT_BASE_SECONDS + VALIDATION_SECONDS_PER_PROVIDER * provider_count
+
+
+def job_deadline_seconds(size_bytes: int) -> float:
+    return JOB_DEADLINE_BASE_SECONDS + JOB_DEADLINE_SECONDS_PER_MB * size_bytes / (1024 * 1024)
+
+
+def deadline_headers(deadline_at: float, cap_seconds: typing.Optional[float] = None) -> dict:
+    """X-Deadline-Ms for a downstream call: the job's remaining budget, optionally capped per call."""
+    left = deadline_at - time.monotonic()
+    if cap_seconds is not None:
+        left = min(left, cap_seconds)
+    return {DEADLINE_HEADER: str(max(int(left * 1000), 0))}
+
+
+async def spool_upload(
+    file: UploadFile, scanner: typing.Optional[NPIScanner] = None
+) -> typing.Tuple[str, int, str]:
+    """
+    Copies the upload to a temp file in fixed-size chunks; returns
+    (path, size, sha256 hex digest of the bytes). A scanner sees each chunk.
+    """
+    fd, path = tempfile.mkstemp(prefix="valid8-upload-", suffix=".csv", dir=UPLOAD_SPOOL_DIR)
+    size = 0
+    digest = hashlib.sha256()
     try:
-        # --- Update: Starting Ingestion ---
-        JOBS[job_id].update({"status": "processing", "stage": "ingestion", "progress": 10})
-        
-        # 1. Ingestion
-        try:
-            files_payload = {
-                "file": (file_name, file_content, content_type)
-            }
-            ingest_resp = requests.post(
-                INGESTION_URL,
-                files=files_payload,
-                timeout=120
-            )
-            if ingest_resp.status_code != 200:
-                raise Exception(f"Ingestion failed: {ingest_resp.text}")
-            
-            cleaned_data = ingest_resp.json()
-            
-        except Exception as e:
-            JOBS[job_id].update({"status": "failed", "error": str(e), "progress": 0})
-            return
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                out.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                if scanner is not None:
+                    scanner.feed(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, size, digest.hexdigest()
+
+
+_fingerprint: typing.Dict[str, typing.Any] = {"value": None, "read_at": 0.0}
 
-        # --- Update: Cleaning Done, Starting Validation ---
-        JOBS[job_id].update({"status": "processing", "stage": "validation", "progress": 50})
-
-        # 2. Extract providers
-        providers = cleaned_data.get("providers", [])
-        
-        if not providers:
-            result = {
-                "status": "success",
-                "cleaned_count": 0,
-                "validated_count": 0,
-                "cleaned_providers": [],
-                "validated_providers": [],
-                "results": []
-            }
-            JOBS[job_id].update({"status": "completed", "stage": "finished", "progress": 100, "result": result})
-            return
 
-        # 3. Validation
+async def pipeline_fingerprint() -> typing.Optional[str]:
+    """
+    Hash of the pipeline config the services report, or None when one of
+    them cannot be reached (the upload is then not deduplicated).
+    """
+    if _fingerprint["value"] is not None and time.monotonic() - _fingerprint["read_at"] < PIPELINE_CONFIG_TTL_SECONDS:
+        return _fingerprint["value"]
+    config: typing.Dict[str, typing.Any] = {"orchestrator": {"pipeline_version": PIPELINE_VERSION}}
+    try:
+        responses = await asyncio.gather(*(http_client().get(url, timeout=5.0) for url in SERVICE_CONFIG_URLS.values()))
+        for name, resp in zip(SERVICE_CONFIG_URLS, responses):
+            resp.raise_for_status()
+            reported = resp.json()
+            config[name] = {key: reported.get(key) for key in PIPELINE_CONFIG_FIELDS}
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"[ORCHESTRATOR] Could not read service configs, not deduplicating: {str(e) or type(e).__name__}")
+        return None
+    _fingerprint["value"] = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+    _fingerprint["read_at"] = time.monotonic()
+    return _fingerprint["value"]
+
+
+def content_hash(upload_digest: str, fingerprint: str) -> str:
+    """Identifies a job by what it processes and how it would be processed."""
+    return hashlib.sha256(f"{upload_digest}:{fingerprint}".encode()).hexdigest()
+
+
+def encode_cursor(row: int, seq: int) -> str:
+    return base64.urlsafe_b64encode(f"{row}:{seq}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> typing.Tuple[int, int]:
+    try:
+        row, seq = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return int(row), int(seq)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def accepted_encodings(header: str) -> typing.Set[str]:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip() for t in header.split(",")}
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+
+def compressed_json(request: Request, payload: typing.Any, etag: str) -> Response:
+    """JSON body compressed with zstd (when installed and accepted) or gzip."""
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        if zstandard is not None and "zstd" in accepted:
+            body = zstandard.ZstdCompressor(level=3).compress(body)
+            headers["Content-Encoding"] = "zstd"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# -----------------------------------------------------------------------------
+# Background Task Logic
+# -----------------------------------------------------------------------------
+def add_counts(total: dict, counts: dict) -> None:
+    for key, n in counts.items():
+        total[key] = total.get(key, 0) + n
+
+
+def routing_summary(routing: dict) -> dict:
+    """Adds the escalation rate (escalated share of fast-tier results) to each stage's tier counts."""
+    summary = {}
+    for stage, counts in routing.items():
+        tried = counts.get("fast", 0) + counts.get("escalated", 0)
+        summary[stage] = {**counts, "escalation_rate": round(counts.get("escalated", 0) / tried, 3) if tried else 0.0}
+    return summary
+
+
+async def validate_providers(job_id: str, providers: list, deadline_at: float) -> dict:
+    """
+    Posts providers to the validation service, then re-submits only the ones
+    whose outcome was "error". The service checkpoints completed results per
+    job, so a re-submit never re-validates a provider that already succeeded.
+    A failed call (non-200 or transport error) makes every provider in it an
+    "error" outcome, so it is re-submitted like any other and never fails the
+    job. Each call carries the smaller of its own timeout and the job's
+    remaining budget; re-submits stop once the budget is spent.
+    """
+    validated = [None] * len(providers)
+    outcomes = [{"index": i, "status": "error", "error": "Job deadline exceeded before validation"}
+                for i in range(len(providers))]
+    todo = list(range(len(providers)))
+    routing = {}
+
+    for round_no in range(VALIDATION_RESUBMIT_ROUNDS + 1):
+        left = deadline_at - time.monotonic()
+        if left < MIN_CALL_BUDGET_SECONDS:
+            break
+        call_seconds = min(validation_seconds(len(todo)), left)
+        error = None
         try:
-            validate_resp = requests.post(
+            validate_resp = await http_client().post(
                 VALIDATION_URL,
-                json=providers,
-                timeout=120
+                json=[providers[i] for i in todo],
+                headers={"X-Job-Id": job_id, **deadline_headers(deadline_at, call_seconds)},
+                # A little slack so the service's own 504 arrives before we give up
+                timeout=httpx.Timeout(call_seconds + 5.0, connect=10.0),
             )
             if validate_resp.status_code != 200:
-                raise Exception(f"Validation failed: {validate_resp.text}")
-            
-            validated_data = validate_resp.json()
-            
-        except Exception as e:
-            JOBS[job_id].update({"status": "failed", "error": str(e), "progress": 0})
-            return
+                error = f"Validation failed ({validate_resp.status_code}): {validate_resp.text}"
+        except httpx.HTTPError as e:
+            error = f"Validation request failed: {str(e) or type(e).__name__}"
 
-        # --- Update: Finalizing ---
-        JOBS[job_id].update({"status": "processing", "stage": "finalizing", "progress": 90})
+        if error is not None:
+            print(f"[ORCHESTRATOR] Job {job_id}: {error}")
+            for i in todo:
+                outcomes[i] = {"index": i, "status": "error", "error": error}
+        else:
+            data = validate_resp.json()
+            add_counts(routing, data.get("routing") or {})
+            # Older validation services return no outcomes: everything succeeded
+            round_outcomes = data.get("outcomes") or [{"status": "success"} for _ in todo]
+            for i, result, outcome in zip(todo, data.get("validated", []), round_outcomes):
+                validated[i] = result
+                outcomes[i] = {"index": i, "status": outcome.get("status"), "error": outcome.get("error")}
 
-        validated_results = validated_data.get("validated", [])
-        
-        final_result = {
-            "status": "success",
-            "cleaned_count": len(providers),
-            "validated_count": len(validated_results),
-            "cleaned_providers": providers,
-            "validated_providers": validated_results,
-            "results": validated_results
-        }
+        todo = [i for i in todo if outcomes[i]["status"] == "error"]
+        if not todo or round_no == VALIDATION_RESUBMIT_ROUNDS:
+            break
+        print(f"[ORCHESTRATOR] Job {job_id}: re-submitting {len(todo)} failed providers (round {round_no + 1})")
+
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome["status"]] = counts.get(outcome["status"], 0) + 1
+    return {
+        "validated": validated,
+        "outcome_counts": counts,
+        "failed": [o for o in outcomes if o["status"] == "error"],
+        "routing": routing,
+    }
 
-        # --- Done ---
-        JOBS[job_id].update({"status": "completed", "stage": "finished", "progress": 100, "result": final_result})
 
+async def process_pipeline_task(job_id: str, file_name: str, file_path: str, file_size: int, content_type: str):
+    """
+    Runs on a scheduler worker: runs the pipeline within its deadline, then
+    removes the spooled upload.
+    """
+    budget = job_deadline_seconds(file_size)
+    try:
+        # wait_for cancels the pipeline, and with it every downstream call, at the deadline
+        await asyncio.wait_for(
+            run_pipeline(job_id, file_name, file_path, file_size, content_type, time.monotonic() + budget), budget
+        )
+    except asyncio.TimeoutError:
+        await asyncio.to_thread(
+            JOBS.update, job_id, status="failed", error=f"Job deadline of {budget:.0f}s exceeded", progress=0
+        )
     except Exception as e:
         # Catch-all
-        JOBS[job_id].update({"status": "failed", "error": str(e), "progress": 0})
+        await asyncio.to_thread(JOBS.update, job_id, status="failed", error=str(e), progress=0)
+    finally:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+
+async def run_pipeline(
+    job_id: str, file_name: str, file_path: str, file_size: int, content_type: str, deadline_at: float
+):
+    """
+    Streams the spooled upload to ingestion, reads cleaned providers back as
+    NDJSON and forwards each batch to validation as it arrives, with at most
+    VALIDATION_MAX_IN_FLIGHT batches outstanding; reading the stream pauses
+    while validation is saturated. Progress is accounted per row: ingestion
+    reports rows settled, validation counts providers returned. Job store
+    writes run on a worker thread, one at a time and in order.
+    """
+    tasks = []
+    slots = asyncio.Semaphore(VALIDATION_MAX_IN_FLIGHT)
+    # Row counts pushed to /jobs/{job_id}/events watchers
+    counts = {"rows_total": 0, "rows_ingested": 0, "rows_validated": 0}
+    progress = JobProgress()
+    ingestion, validation = progress.stages["ingestion"], progress.stages["validation"]
+    # LLM model tier counts reported by each service
+    routing = {"ingestion": {}, "validation": {}}
+    # Keeps concurrent batches' writes in order, so progress never goes backwards
+    store_lock = asyncio.Lock()
+
+    async def store(write, *args, **kwargs) -> None:
+        async with store_lock:
+            await asyncio.to_thread(write, job_id, *args, **kwargs)
+
+    async def publish(**fields) -> None:
+        await store(
+            JOBS.update, progress=progress.percent(), counts=dict(counts), stages=progress.snapshot(),
+            llm_routing=routing_summary(routing), **fields,
+        )
+
+    # --- Update: Starting Ingestion ---
+    ingestion.start()
+    await publish(status="processing", stage="ingestion")
+
+    async def validate_batch(providers: list) -> dict:
+        # Results go straight to the job store; only counts are kept in memory
+        try:
+            validated_data = await validate_providers(job_id, providers, deadline_at)
+        finally:
+            slots.release()
+        errors = {f["index"]: f["error"] for f in validated_data["failed"]}
+        await store(JOBS.append_records, [
+            (provider, result, "error" if i in errors else "success", errors.get(i))
+            for i, (provider, result) in enumerate(zip(providers, validated_data["validated"]))
+        ])
+        counts["rows_validated"] += len(providers)
+        add_counts(routing["validation"], validated_data["routing"])
+        validation.advance(counts["rows_validated"])
+        await publish()
+        return validated_data["outcome_counts"]
+
+    summarized = False
+    try:
+        # 1. Ingestion stream -> validation
+        try:
+            with open(file_path, "rb") as upload:
+                files_payload = {
+                    "file": (file_name, upload, content_type)
+                }
+                async with http_client().stream(
+                    "POST", INGESTION_STREAM_URL, files=files_payload,
+                    headers=deadline_headers(deadline_at), timeout=ingestion_timeout(file_size),
+                ) as ingest_resp:
+                    if ingest_resp.status_code != 200:
+                        await ingest_resp.aread()
+                        raise Exception(f"Ingestion failed: {ingest_resp.text}")
+
+                    async for line in ingest_resp.aiter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event["type"] == "start":
+                            counts["rows_total"] = event.get("total_rows", 0)
+                            ingestion.advance(0, counts["rows_total"])
+                            # Until ingestion ends, expect about one provider per row
+                            validation.total = counts["rows_total"]
+                            await publish()
+                        elif event["type"] == "providers":
+                            await slots.acquire()
+                            validation.start()
+                            tasks.append(asyncio.create_task(validate_batch(event["providers"])))
+                            counts["rows_ingested"] += len(event["providers"])
+                            validation.total = max(validation.total, counts["rows_ingested"])
+                        elif event["type"] == "progress":
+                            ingestion.advance(event["rows_done"], event.get("total_rows"), event.get("rows_per_second"))
+                            await publish()
+                        elif event["type"] == "summary":
+                            summarized = True
+                            add_counts(routing["ingestion"], event.get("routing") or {})
+                        elif event["type"] == "error":
+                            raise Exception(f"Ingestion failed: {event.get('detail')}")
+                if not summarized:
+                    # Ingestion hit its deadline (or died) after the stream had started
+                    raise Exception("Ingestion stream ended before its summary")
+
+        except Exception as e:
+            await store(JOBS.update, status="failed", error=str(e) or type(e).__name__, progress=0)
+            return
+
+        # --- Update: Cleaning Done, Validation draining ---
+        ingestion.finish()
+        validation.total = counts["rows_ingested"]
+        await publish(status="processing", stage="validation")
+
+        # 2. Wait for the outstanding validation batches
+        outcomes = {}
+        try:
+            for task in tasks:
+                for status, n in (await task).items():
+                    outcomes[status] = outcomes.get(status, 0) + n
+            validation.finish()
+            await publish(stage="finalizing")
+
+        except Exception as e:
+            await store(JOBS.update, status="failed", error=str(e) or type(e).__name__, progress=0)
+            return
+
+        # --- Done ---
+        await store(JOBS.finish, {
+            "status": "partial" if outcomes.get("error") else "success",
+            "validation_outcomes": outcomes,
+            "llm_routing": routing_summary(routing),
+        })
+    finally:
+        # Failure, deadline or shutdown: outstanding validation calls are cancelled, not orphaned
+        for task in tasks:
+            task.cancel()
 
 
 # -----------------------------------------------------------------------------
@@ -144,56 +539,221 @@ def process_pipeline_task(job_id: str, file_name: str, file_content: bytes, cont
 @app.get("/health")
 def health_check():
     """Basic health check."""
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "scheduler": SCHEDULER.snapshot(),
+        "jobs": JOBS.count_by_status(),
+        "job_store": JOBS.stats(),
+        "event_watchers": EVENTS.watcher_count(),
+    }
+
+
+def duplicate_response(job_id: str, file_name: str) -> JobResponse:
+    job = JOBS.get(job_id)
+    status = job["status"] if job else "pending"
+    print(f"[ORCHESTRATOR] Upload {file_name} matches job {job_id} ({status}); reusing it")
+    return JobResponse(
+        job_id=job_id,
+        status=status,
+        message=f"Identical upload already {'processed' if status == 'completed' else 'in progress'}.",
+        deduplicated=True,
+        **(SCHEDULER.position(job_id) or {}),
+    )
 
 
 @app.post("/start-job", response_model=JobResponse)
-async def start_job(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def start_job(
+    request: Request,
+    file: UploadFile = File(...),
+    dedupe: bool = True,
+    priority: typing.Optional[str] = Query(None, pattern="^(interactive|batch)$"),
+    x_submitter: typing.Optional[str] = Header(None),
+):
     """
     Async flow:
-    1. Receives file.
-    2. Spawns background task.
-    3. Returns job_id immediately.
+    1. Spools the upload to disk, hashing it on the way.
+    2. With dedupe (default), an identical upload under the same pipeline
+       config returns the existing completed or in-flight job instead.
+    3. Rejects with 429 (queue position and wait estimate) when the queue is
+       full overall or for this submitter (X-Submitter header, else client IP).
+    4. Queues the job: small uploads as interactive, large ones as batch.
+    5. Sends NPIs found in the raw upload to validation for prefetching.
+    6. Returns job_id immediately.
     """
     job_id = secrets.token_hex(4)
-    file_content = await file.read()
+    scanner = NPIScanner() if NPI_PREFETCH_ENABLED else None
+    file_path, file_size, upload_digest = await spool_upload(file, scanner)
+    fingerprint = await pipeline_fingerprint() if dedupe else None
+    job_hash = content_hash(upload_digest, fingerprint) if fingerprint else None
+    submitter = x_submitter or (request.client.host if request.client else "anonymous")
+
+    if job_hash:
+        existing_id = await asyncio.to_thread(JOBS.find_by_hash, job_hash)
+        if existing_id is not None:
+            os.remove(file_path)
+            return await asyncio.to_thread(duplicate_response, existing_id, file.filename)
+
+    job_priority = SCHEDULER.classify(file_size, priority)
+    rejection = await asyncio.to_thread(SCHEDULER.admit, submitter, job_priority)
+    if rejection is not None:
+        os.remove(file_path)
+        raise HTTPException(
+            status_code=429,
+            detail={"message": "Job queue is full; retry later.", **rejection},
+            headers={"Retry-After": str(max(1, int(rejection["estimated_wait_seconds"])))},
+        )
     
     # Initialize job state
-    JOBS[job_id] = {
-        "status": "pending",
-        "stage": "upload",
-        "progress": 0,
-        "result": None,
-        "error": None
-    }
-    
-    # Start task
-    background_tasks.add_task(
-        process_pipeline_task, 
-        job_id, 
-        file.filename, 
-        file_content, 
-        file.content_type
+    fields = dict(
+        status="pending", stage="queued", progress=0, file_name=file.filename, file_size=file_size,
+        priority=job_priority, submitter=submitter,
     )
+    if job_hash:
+        existing_id, created = await asyncio.to_thread(JOBS.create_or_get, job_id, job_hash, **fields)
+        if not created:
+            # Lost a race with an identical concurrent upload
+            os.remove(file_path)
+            return await asyncio.to_thread(duplicate_response, existing_id, file.filename)
+    else:
+        await asyncio.to_thread(JOBS.create, job_id, **fields)
+
+    await SCHEDULER.submit(job_id, job_priority, submitter, {
+        "file_name": file.filename,
+        "file_path": file_path,
+        "file_size": file_size,
+        "content_type": file.content_type,
+    })
+    if scanner is not None:
+        # Validation looks these up while the job queues and ingests
+        start_prefetch(http_client(), NPI_PREFETCH_URL, job_id, scanner.finish())
     
-    return JobResponse(job_id=job_id, status="started", message="Pipeline started in background.")
+    return JobResponse(
+        job_id=job_id,
+        status="queued",
+        message="Pipeline queued.",
+        **(await asyncio.to_thread(SCHEDULER.position, job_id) or {}),
+    )
 
 
 @app.get("/status/{job_id}", response_model=JobStatus)
-def get_job_status(job_id: str):
-    if job_id not in JOBS:
+def get_job_status(job_id: str, include_result: bool = True):
+    """Polling endpoint; prefer /jobs/{job_id}/events plus /jobs/{job_id}/result."""
+    job = JOBS.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
+    counts = job["meta"].get("counts", {})
+    stages = {name: StageStatus(**stage) for name, stage in job["meta"].get("stages", {}).items()}
     
-    job = JOBS[job_id]
     return JobStatus(
         job_id=job_id,
         status=job["status"],
         stage=job["stage"],
         progress=job["progress"],
         error=job.get("error"),
-        result=job.get("result")
+        result=JOBS.get_result(job_id) if include_result else None,
+        rows_done=counts.get("rows_validated", 0),
+        rows_total=counts.get("rows_total", 0),
+        # Validation trails ingestion, so the job ends with whichever stage is further out
+        eta_seconds=max((st.eta_seconds for st in stages.values() if st.eta_seconds is not None), default=None),
+        stages=stages,
+        llm_routing=job["meta"].get("llm_routing", {}),
+        **(SCHEDULER.position(job_id) or {}),
+    )
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-Sent Events: `progress` deltas, then `completed` or `failed`."""
+    if await asyncio.to_thread(JOBS.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        job_event_stream(JOBS, EVENTS, job_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/results")
+def get_job_results(
+    job_id: str,
+    request: Request,
+    cursor: typing.Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    requires_manual_review: typing.Optional[bool] = None,
+    max_confidence: typing.Optional[float] = Query(None, ge=0.0, le=1.0),
+    outcome: typing.Optional[str] = None,
+):
+    """
+    One page of a completed job's providers, in source_row order. Pass
+    `next_cursor` back as `cursor` for the next page. Responses carry an ETag;
+    a matching If-None-Match returns 304 without reading any records.
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    # Completed jobs never change, so the page identity is the job plus the query
+    query = [job_id, job["updated_at"], job["record_count"], cursor, limit, requires_manual_review, max_confidence, outcome]
+    etag = 'W/"' + hashlib.sha256(json.dumps(query).encode()).hexdigest()[:32] + '"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+    filters = RecordFilter(requires_manual_review=requires_manual_review, max_confidence=max_confidence, outcome=outcome)
+    after = decode_cursor(cursor) if cursor else (-1, -1)
+    records = JOBS.page_records(job_id, after, limit, filters)
+    items = [{
+        "seq": r["seq"],
+        "source_row": r["row"],
+        "outcome": r["outcome"],
+        "error": r["error"],
+        "cleaned": r["cleaned"],
+        "validated": r["validated"],
+    } for r in records]
+
+    return compressed_json(request, {
+        "job_id": job_id,
+        "total_records": job["record_count"],
+        "items": items,
+        "next_cursor": encode_cursor(records[-1]["row"], records[-1]["seq"]) if len(records) == limit else None,
+    }, etag)
+
+
+@app.get("/jobs/{job_id}/export")
+def export_job(
+    job_id: str,
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    requires_manual_review: typing.Optional[bool] = None,
+    max_confidence: typing.Optional[float] = Query(None, ge=0.0, le=1.0),
+    outcome: typing.Optional[str] = None,
+):
+    """Streams the job's merged, flattened records as a CSV, NDJSON or Parquet download."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    filters = RecordFilter(requires_manual_review=requires_manual_review, max_confidence=max_confidence, outcome=outcome)
+    return StreamingResponse(
+        EXPORTERS[format](JOBS.iter_records(job_id, filters)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="valid8_{job_id}.{format}"'},
     )
 
 
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return JOBS.get_result(job_id)
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,101 @@
+"""
+Speculative NPI prefetch for uploads.
+- NPIScanner picks NPI candidates out of the upload bytes while they are
+  spooled: standalone 10-digit runs starting with 1 or 2 that pass the NPI
+  check digit (Luhn over the 80840-prefixed number), so phone numbers and
+  other digit runs are mostly filtered out
+- start_prefetch() posts them to the validation service's /npi/prefetch,
+  which warms its NPI cache in the background while the job queues and
+  ingests, taking registry latency off the validation stage
+- Best effort only: a failed prefetch is logged and never affects the job
+"""
+
+import asyncio
+import os
+import re
+from typing import Dict, List, Set
+
+import httpx
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+NPI_PREFETCH_ENABLED = os.getenv("NPI_PREFETCH_ENABLED", "true").lower() == "true"
+# Candidates sent per upload; the rest are looked up during validation as usual
+NPI_PREFETCH_MAX = int(os.getenv("NPI_PREFETCH_MAX", "5000"))
+NPI_PREFETCH_TIMEOUT_SECONDS = float(os.getenv("NPI_PREFETCH_TIMEOUT_SECONDS", "10"))
+
+NPI_CANDIDATE = re.compile(rb"(?<![0-9])[12][0-9]{9}(?![0-9])")
+TRAILING_DIGITS = re.compile(rb"[0-9]*\Z")
+
+# Running prefetch requests, referenced so they are not garbage collected
+_tasks: Set[asyncio.Task] = set()
+
+
+def is_valid_npi(npi: str) -> bool:
+    """NPI check digit: Luhn over the number prefixed with the 80840 issuer code."""
+    if len(npi) != 10 or not npi.isdigit() or npi[0] not in "12":
+        return False
+    total = 0
+    for i, ch in enumerate(reversed("80840" + npi)):
+        digit = int(ch)
+        if i % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+class NPIScanner:
+    """Fed the upload chunk by chunk; a digit run split across chunks is carried over."""
+
+    def __init__(self, limit: int = NPI_PREFETCH_MAX):
+        self.limit = limit
+        # Insertion-ordered set of NPIs found so far
+        self._found: Dict[str, None] = {}
+        self._tail = b""
+
+    @property
+    def npis(self) -> List[str]:
+        return list(self._found)
+
+    def feed(self, chunk: bytes) -> None:
+        if len(self._found) >= self.limit:
+            return
+        data = self._tail + chunk
+        split = TRAILING_DIGITS.search(data).start()
+        # A run longer than 10 digits cannot be an NPI however it continues
+        self._tail = data[split:] if len(data) - split <= 10 else data[-11:]
+        self._scan(data[:split])
+
+    def finish(self) -> List[str]:
+        self._scan(self._tail)
+        self._tail = b""
+        return self.npis
+
+    def _scan(self, data: bytes) -> None:
+        for match in NPI_CANDIDATE.finditer(data):
+            if len(self._found) >= self.limit:
+                return
+            npi = match.group().decode("ascii")
+            if is_valid_npi(npi):
+                self._found[npi] = None
+
+
+async def _prefetch(client: httpx.AsyncClient, url: str, job_id: str, npis: List[str]) -> None:
+    try:
+        resp = await client.post(url, json=npis, timeout=NPI_PREFETCH_TIMEOUT_SECONDS)
+        resp.raise_for_status()
+        print(f"[ORCHESTRATOR] Job {job_id}: prefetching NPIs {resp.json()}")
+    except Exception as e:
+        print(f"[ORCHESTRATOR] Job {job_id}: NPI prefetch failed: {e}")
+
+
+def start_prefetch(client: httpx.AsyncClient, url: str, job_id: str, npis: List[str]) -> None:
+    """Fires the prefetch request without waiting for it."""
+    if not NPI_PREFETCH_ENABLED or not npis:
+        return
+    task = asyncio.create_task(_prefetch(client, url, job_id, npis))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
@@ -0,0 +1,87 @@
+"""
+Row-level progress accounting for pipeline jobs.
+- Each stage (ingestion, validation) tracks rows done out of rows expected,
+  its throughput since the stage started and an ETA from that throughput
+- `updated_at` per stage shows when it last moved, which tells a slow job
+  from a stuck one
+- The 0-100 job progress is derived from the row counts instead of fixed
+  milestones
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+STAGES = ("ingestion", "validation")
+# Job progress reserves a little at each end for upload and finalizing
+PROGRESS_START = 5
+PROGRESS_END = 95
+
+
+@dataclass
+class StageProgress:
+    total: int = 0
+    done: int = 0
+    started_at: Optional[float] = None
+    updated_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Rate reported by the service doing the work, when it reports one
+    reported_rate: Optional[float] = None
+
+    def start(self) -> None:
+        if self.started_at is None:
+            self.started_at = self.updated_at = time.time()
+
+    def advance(self, done: int, total: Optional[int] = None, rate: Optional[float] = None) -> None:
+        self.start()
+        now = time.time()
+        self.done = done
+        if total is not None:
+            self.total = total
+        if rate is not None:
+            self.reported_rate = rate
+        self.updated_at = now
+
+    def finish(self) -> None:
+        self.finished_at = self.updated_at = time.time()
+        self.total = self.done
+
+    def fraction(self) -> float:
+        if self.finished_at is not None:
+            return 1.0
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+    def rows_per_second(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        if self.reported_rate and self.finished_at is None:
+            return self.reported_rate
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.done / elapsed if elapsed > 0 and self.done else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        rate = self.rows_per_second()
+        remaining = max(self.total - self.done, 0)
+        eta = 0.0 if self.finished_at is not None else (remaining / rate if rate else None)
+        return {
+            "rows_done": self.done,
+            "rows_total": self.total,
+            "rows_per_second": round(rate, 2) if rate else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+            "finished": self.finished_at is not None,
+        }
+
+
+class JobProgress:
+    def __init__(self):
+        self.stages = {name: StageProgress() for name in STAGES}
+
+    def percent(self) -> int:
+        # Ingestion and validation weigh the same; validation trails ingestion
+        share = sum(stage.fraction() for stage in self.stages.values()) / len(self.stages)
+        return PROGRESS_START + int((PROGRESS_END - PROGRESS_START) * share)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stage.snapshot() for name, stage in self.stages.items()}
@@ -0,0 +1,172 @@
+"""
+Pipeline scheduler for the orchestrator.
+- Jobs are queued in the job store, so the queue survives restarts and is
+  shared by every orchestrator process on the host
+- A fixed pool of workers claims jobs: interactive (small uploads) before
+  batch, then the submitter with the fewest running jobs, then oldest first
+- INTERACTIVE_RESERVED_WORKERS workers only take interactive jobs, so small
+  uploads start promptly while bulk loads occupy the rest of the pool
+- admit() rejects new work once its priority class is full (QUEUE_MAX_DEPTH
+  per class, so a bulk backlog never locks out interactive uploads) or the
+  submitter has too many queued jobs, with a position and wait estimate for
+  the 429 response
+- Workers heartbeat their claims; a reaper re-queues claims whose worker
+  stopped heartbeating (crash, kill) up to QUEUE_MAX_ATTEMPTS runs per job,
+  then marks the job failed
+"""
+
+import asyncio
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+INTERACTIVE_RESERVED_WORKERS = int(os.getenv("INTERACTIVE_RESERVED_WORKERS", "1"))
+# Uploads up to this size are interactive unless the caller asks for batch
+INTERACTIVE_MAX_BYTES = int(os.getenv("INTERACTIVE_MAX_BYTES", str(2 * 1024 * 1024)))
+QUEUE_MAX_DEPTH = int(os.getenv("QUEUE_MAX_DEPTH", "100"))
+QUEUE_MAX_PER_SUBMITTER = int(os.getenv("QUEUE_MAX_PER_SUBMITTER", "20"))
+# Idle workers re-check the shared queue this often (jobs queued by other processes)
+QUEUE_POLL_SECONDS = float(os.getenv("QUEUE_POLL_SECONDS", "2.0"))
+# Running claims are heartbeated, and stale claims reaped, this often
+QUEUE_REAP_SECONDS = float(os.getenv("QUEUE_REAP_SECONDS", "30"))
+# Claims with no heartbeat for this long belonged to a worker that died
+QUEUE_STALE_SECONDS = float(os.getenv("QUEUE_STALE_SECONDS", "120"))
+# Runs per job (the first plus re-queues after a dead worker) before it is failed
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+# Starting point for wait estimates until real job durations are observed
+JOB_SECONDS_ESTIMATE = float(os.getenv("JOB_SECONDS_ESTIMATE", "60"))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+
+
+class Scheduler:
+    def __init__(self, store: Any, workers: int, reserved_interactive: int = INTERACTIVE_RESERVED_WORKERS):
+        self.store = store
+        self.workers = max(1, workers)
+        # Always leave at least one worker that can take batch jobs
+        self.reserved_interactive = min(max(0, reserved_interactive), self.workers - 1)
+        self.avg_job_seconds = JOB_SECONDS_ESTIMATE
+        self.busy = 0
+        self.requeued = 0
+        # Jobs claimed by this process's workers, heartbeated by the reaper
+        self._running: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def classify(self, file_size: int, requested: Optional[str] = None) -> int:
+        """Large uploads are always batch; callers may demote a small one to batch."""
+        if file_size > INTERACTIVE_MAX_BYTES:
+            return PRIORITY_BATCH
+        return PRIORITIES.get(requested or "interactive", PRIORITY_INTERACTIVE)
+
+    def estimate_wait(self, position: int) -> float:
+        return round(math.ceil(position / self.workers) * self.avg_job_seconds, 1)
+
+    def admit(self, submitter: str, priority: int) -> Optional[Dict[str, Any]]:
+        """None if the job may be queued, else details for the 429 response."""
+        depth = self.store.queue_counts().get(f"queued_p{priority}", 0)
+        mine = self.store.queue_counts(submitter)["queued"]
+        if depth < QUEUE_MAX_DEPTH and mine < QUEUE_MAX_PER_SUBMITTER:
+            return None
+        return {
+            "reason": "queue_full" if depth >= QUEUE_MAX_DEPTH else "submitter_limit",
+            "queue_depth": depth,
+            "submitter_queued": mine,
+            "queue_position": depth + 1,
+            "estimated_wait_seconds": self.estimate_wait(depth + 1),
+        }
+
+    async def submit(self, job_id: str, priority: int, submitter: str, payload: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self.store.enqueue, job_id, priority, submitter, payload)
+        self._wake.set()
+
+    def position(self, job_id: str) -> Optional[Dict[str, Any]]:
+        position = self.store.queue_position(job_id)
+        if position is None:
+            return None
+        return {"queue_position": position, "estimated_wait_seconds": self.estimate_wait(position)}
+
+    # -------------------------------------------------------------------------
+    # Workers
+    # -------------------------------------------------------------------------
+    def start(self, run_job: Callable[..., Awaitable[None]]) -> None:
+        self._tasks.append(asyncio.create_task(self._reaper()))
+        for n in range(self.workers):
+            max_priority = PRIORITY_INTERACTIVE if n < self.reserved_interactive else PRIORITY_BATCH
+            self._tasks.append(asyncio.create_task(self._worker(run_job, max_priority)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, run_job: Callable[..., Awaitable[None]], max_priority: int) -> None:
+        while True:
+            claimed = await asyncio.to_thread(self.store.claim, max_priority)
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), QUEUE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+
+            job_id, payload = claimed
+            started = time.monotonic()
+            self.busy += 1
+            self._running.add(job_id)
+            try:
+                await run_job(job_id, **payload)
+            except asyncio.CancelledError:
+                # Shutting down: write directly rather than await a thread
+                self.store.update(job_id, status="failed", error="Orchestrator shut down before the job finished")
+                self.store.release(job_id)
+                raise
+            finally:
+                self.busy -= 1
+                self._running.discard(job_id)
+            await asyncio.to_thread(self.store.release, job_id)
+            # Exponential moving average feeds queue wait estimates
+            self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * (time.monotonic() - started)
+
+    async def _reaper(self) -> None:
+        while True:
+            try:
+                if await asyncio.to_thread(self.reap):
+                    self._wake.set()
+            except Exception as e:
+                print(f"[ORCHESTRATOR] Reaping stale claims failed: {e}")
+            await asyncio.sleep(QUEUE_REAP_SECONDS)
+
+    def reap(self) -> int:
+        """
+        Heartbeats this process's claims, then re-queues or fails claims left
+        by dead workers; returns how many were re-queued. Blocks on the store.
+        """
+        self.store.heartbeat(list(self._running))
+        requeued, abandoned = self.store.reap_claims(QUEUE_STALE_SECONDS, QUEUE_MAX_ATTEMPTS)
+        for job_id in requeued:
+            print(f"[ORCHESTRATOR] Job {job_id} was abandoned by a stopped worker; re-queued")
+            self.store.update(job_id, status="pending", stage="queued", progress=0, error=None)
+        for job_id in abandoned:
+            print(f"[ORCHESTRATOR] Job {job_id} was abandoned by a stopped worker {QUEUE_MAX_ATTEMPTS} times; marking failed")
+            self.store.update(job_id, status="failed", error="Worker stopped before the job finished")
+        self.requeued += len(requeued)
+        return len(requeued)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "reserved_interactive": self.reserved_interactive,
+            "busy": self.busy,
+            "requeued": self.requeued,
+            "avg_job_seconds": round(self.avg_job_seconds, 1),
+            **self.store.queue_counts(),
+        }
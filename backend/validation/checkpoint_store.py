@@ -0,0 +1,137 @@
+"""
+Checkpoints of completed validation results.
+- Keyed by job id and a content hash of the provider record
+- A re-submitted /validate call for the same job returns stored results
+  instead of re-validating them
+- SQLite (WAL), entries expire after CHECKPOINT_TTL_SECONDS; expired rows
+  are deleted by run_expiry() every CHECKPOINT_SWEEP_SECONDS, not on save
+- Methods block; the service calls them with asyncio.to_thread
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "true").lower() == "true"
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(os.path.dirname(__file__), ".checkpoints.sqlite3"))
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(24 * 3600)))
+CHECKPOINT_SWEEP_SECONDS = float(os.getenv("CHECKPOINT_SWEEP_SECONDS", "600"))
+
+
+def provider_key(provider: Any) -> str:
+    material = json.dumps(provider, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+class CheckpointStore:
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.writes = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoints (
+                job_id TEXT NOT NULL,
+                provider_key TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (job_id, provider_key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_created ON checkpoints(created_at)")
+        self._conn.commit()
+
+    def load(self, job_id: str, keys: Iterable[str]) -> Dict[str, dict]:
+        keys = list(set(keys))
+        found: Dict[str, dict] = {}
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"""SELECT provider_key, result FROM checkpoints
+                        WHERE job_id = ? AND created_at >= ? AND provider_key IN ({",".join("?" * len(chunk))})""",
+                    (job_id, cutoff, *chunk),
+                ).fetchall()
+                found.update((k, json.loads(v)) for k, v in rows)
+            self.hits += len(found)
+        return found
+
+    def save(self, job_id: str, results: Iterable[Tuple[str, dict]]) -> None:
+        now = time.time()
+        rows = [(job_id, key, json.dumps(result), now) for key, result in results]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO checkpoints (job_id, provider_key, result, created_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self.writes += len(rows)
+
+    def expire(self) -> int:
+        """Deletes checkpoints past their TTL; load() already ignores them."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM checkpoints WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            self._conn.commit()
+        self.expired += max(deleted, 0)
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, jobs = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT job_id) FROM checkpoints"
+            ).fetchone()
+        return {
+            "enabled": True, "entries": entries, "jobs": jobs,
+            "hits": self.hits, "writes": self.writes, "expired": self.expired,
+        }
+
+
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoints() -> Optional[CheckpointStore]:
+    """Returns the process-wide store, or None when checkpointing is disabled."""
+    global _store
+    if not CHECKPOINTS_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore(CHECKPOINT_PATH, CHECKPOINT_TTL_SECONDS)
+    return _store
+
+
+async def run_expiry(interval: float = CHECKPOINT_SWEEP_SECONDS) -> None:
+    """Sweeps expired checkpoints every `interval` seconds until cancelled."""
+    while True:
+        store = get_checkpoints()
+        if store is not None:
+            try:
+                await asyncio.to_thread(store.expire)
+            except Exception as e:
+                print(f"[VALIDATION ERROR] Checkpoint expiry failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def checkpoint_stats() -> Dict[str, Any]:
+    store = get_checkpoints()
+    return store.stats() if store else {"enabled": False}
@@ -1,46 +1,368 @@
+"""
+Async LLM client shared by the ingestion and validation services.
+- Gemini: configured once, one GenerativeModel per model name, native async generation
+- Ollama: one pooled keep-alive httpx.AsyncClient
+- Responses go through the persistent llm_cache, read and written on a
+  worker thread so SQLite never blocks the event loop
+- A response_model constrains output: Gemini response_schema, Ollama format
+- Optional limiter (rate_limit.ServiceLimiter) admits uncached calls only
+- The request deadline (deadline.py) is checked before a call queues on the
+  limiter and clips its timeout once admitted; a timed-out call is cancelled,
+  not left running
+- generate_stream() yields text as it arrives (Gemini stream=True, Ollama
+  stream: true) so callers can parse records before the response completes
+- Two model tiers, "fast" and "strong": with routing on, tiers() lists the
+  fast one first and callers escalate only the results they cannot trust
+Kept identical in ingestion/ and validation/; each service picks its model env vars.
+"""
+
+import asyncio
+import json
 import os
-import requests
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
 import google.generativeai as genai
 
-def generate(prompt: str) -> str:
-    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
-
-    if provider == "gemini":
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY is not set")
-        
-        genai.configure(api_key=api_key)
-        
-        # Validation service uses gemini-1.5-pro by default
-        model_name = os.getenv("GEMINI_VALIDATION_MODEL", "gemini-1.5-pro")
-        model = genai.GenerativeModel(model_name)
-        
-        try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            raise RuntimeError(f"Gemini generation failed: {str(e)}")
-
-    elif provider == "ollama":
-        base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        model_name = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
-        
-        url = f"{base_url}/api/generate"
-        payload = {
-            "model": model_name,
-            "prompt": prompt,
-            "stream": False,
-            "format": "json"
-        }
-        
+import deadline
+from llm_cache import get_cache, cache_key
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "120.0"))
+# Fast tier first, strong tier only for what the caller escalates
+LLM_ROUTING_ENABLED = os.getenv("LLM_ROUTING_ENABLED", "true").lower() == "true"
+# Fast-tier results with a confidence below this are escalated
+LLM_ESCALATION_THRESHOLD = float(os.getenv("LLM_ESCALATION_THRESHOLD", "0.7"))
+
+TIER_FAST = "fast"
+TIER_STRONG = "strong"
+# Ollama tiers; without OLLAMA_FAST_MODEL both are OLLAMA_MODEL and routing is off
+OLLAMA_MODEL_ENVS = {TIER_FAST: "OLLAMA_FAST_MODEL", TIER_STRONG: "OLLAMA_MODEL"}
+
+
+def response_schema(response_model: Any) -> Optional[dict]:
+    """Converts a Pydantic model into the flattened schema Gemini accepts."""
+    if not hasattr(response_model, "model_json_schema"):
+        return None
+    schema = response_model.model_json_schema()
+
+    # Helper: Resolve $defs/$ref to handle nested Pydantic models
+    defs = schema.get("$defs", {}) or schema.get("definitions", {})
+
+    def resolve_and_clean(s):
+        # Handle resolution
+        if isinstance(s, dict):
+            if "$ref" in s:
+                ref_key = s["$ref"].split("/")[-1]
+                if ref_key in defs:
+                    return resolve_and_clean(defs[ref_key])
+
+            # Optional[X] comes out as anyOf [X, null]; Gemini wants X marked nullable
+            if "anyOf" in s:
+                options = [o for o in s["anyOf"] if o.get("type") != "null"]
+                if len(options) == 1 and len(options) < len(s["anyOf"]):
+                    rest = {k: v for k, v in s.items() if k != "anyOf"}
+                    return {**resolve_and_clean({**rest, **options[0]}), "nullable": True}
+
+            # Handle cleaning (remove invalid keys for Gemini)
+            return {
+                k: resolve_and_clean(v)
+                for k, v in s.items()
+                if k not in ["default", "title", "$defs", "definitions"]
+            }
+
+        if isinstance(s, list):
+            return [resolve_and_clean(i) for i in s]
+
+        return s
+
+    return resolve_and_clean(schema)
+
+
+def ollama_format(response_model: Any = None) -> Any:
+    """Ollama takes a plain JSON schema for structured output, else free-form JSON."""
+    if hasattr(response_model, "model_json_schema"):
+        return response_model.model_json_schema()
+    return "json"
+
+
+def gemini_config(response_model: Any = None) -> Dict[str, Any]:
+    generation_config: Dict[str, Any] = {}
+    if response_model:
+        generation_config["response_mime_type"] = "application/json"
+        schema = response_schema(response_model)
+        if schema:
+            generation_config["response_schema"] = schema
+    return generation_config
+
+
+class LLMClient:
+    def __init__(
+        self,
+        gemini_models: Dict[str, Tuple[str, str]],
+        default_tier: str = TIER_STRONG,
+        limiter: Any = None,
+    ):
+        # tier -> (env var, default model name)
+        self.gemini_models = gemini_models
+        # The only tier used when routing is off
+        self.default_tier = default_tier
+        self.limiter = limiter
+        self._gemini_configured = False
+        self._gemini_models: Dict[str, genai.GenerativeModel] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+
+    # -------------------------------------------------------------------------
+    # Configuration
+    # -------------------------------------------------------------------------
+    @property
+    def provider(self) -> str:
+        return os.getenv("LLM_PROVIDER", "gemini").lower()
+
+    def model_name(self, provider: Optional[str] = None, tier: Optional[str] = None) -> str:
+        tier = tier or self.default_tier
+        if (provider or self.provider) == "gemini":
+            env, default = self.gemini_models[tier]
+            return os.getenv(env, default)
+        strong = os.getenv(OLLAMA_MODEL_ENVS[TIER_STRONG], "llama3.1:8b")
+        return os.getenv(OLLAMA_MODEL_ENVS[tier]) or strong
+
+    def routing_snapshot(self) -> Dict[str, Any]:
+        return {"tiers": {tier: self.model_name(tier=tier) for tier in self.tiers()}, "threshold": LLM_ESCALATION_THRESHOLD}
+
+    def tiers(self) -> List[str]:
+        """Tiers to try in order; a single one when routing is off or both are the same model."""
+        if not LLM_ROUTING_ENABLED or self.model_name(tier=TIER_FAST) == self.model_name(tier=TIER_STRONG):
+            return [self.default_tier]
+        return [TIER_FAST, TIER_STRONG]
+
+    def _gemini_model(self, model_name: str) -> genai.GenerativeModel:
+        if not self._gemini_configured:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY is not set")
+            genai.configure(api_key=api_key)
+            self._gemini_configured = True
+        if model_name not in self._gemini_models:
+            self._gemini_models[model_name] = genai.GenerativeModel(model_name)
+        return self._gemini_models[model_name]
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+                timeout=httpx.Timeout(OLLAMA_TIMEOUT_SECONDS, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                ),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    # -------------------------------------------------------------------------
+    # Generation
+    # -------------------------------------------------------------------------
+    def _cache_key(self, prompt: str, response_model: Any = None, tier: Optional[str] = None) -> str:
+        provider = self.provider
+        return cache_key(provider, self.model_name(provider, tier), prompt, response_schema(response_model))
+
+    async def invalidate(self, prompt: str, response_model: Any = None, tier: Optional[str] = None) -> None:
+        """Drops a cached response, e.g. after the caller failed to parse it."""
+        cache = get_cache()
+        if cache:
+            await asyncio.to_thread(cache.delete, self._cache_key(prompt, response_model, tier))
+
+    async def generate(
+        self,
+        prompt: str,
+        response_model: Any = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None,
+        tier: Optional[str] = None,
+    ) -> str:
+        """
+        `timeout` covers the provider call only, not time spent waiting on the
+        limiter, and never runs past the request deadline. `tier` defaults to
+        the client's default tier.
+        """
+        cache = get_cache()
+        key = self._cache_key(prompt, response_model, tier) if cache else None
+        if cache and use_cache:
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                return cached
+
+        # Refused before queuing, so an expiring deadline never fails inside a limiter slot
+        deadline.budget(timeout)
+        async with self._slot():
+            text = await self._generate_within(prompt, response_model, timeout, tier)
+        if cache and text:
+            await asyncio.to_thread(cache.put, key, text)
+        return text
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        response_model: Any = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None,
+        tier: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Like generate(), but yields the response text piece by piece. A cached
+        response comes back as one piece; only a stream read to the end is cached.
+        """
+        cache = get_cache()
+        key = self._cache_key(prompt, response_model, tier) if cache else None
+        if cache and use_cache:
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
+        deadline.budget(timeout)
+        async with self._slot():
+            async for part in self._stream_within(prompt, response_model, timeout, tier):
+                parts.append(part)
+                yield part
+        text = "".join(parts)
+        if cache and text:
+            await asyncio.to_thread(cache.put, key, text)
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self.limiter is None:
+            yield
+        else:
+            async with self.limiter.slot():
+                yield
+
+    async def _stream_within(
+        self, prompt: str, response_model: Any, timeout: Optional[float], tier: Optional[str]
+    ) -> AsyncIterator[str]:
+        # `timeout` bounds the whole stream, not each piece
+        timeout = deadline.clip(timeout)
+        ends_at = None if timeout is None else time.monotonic() + timeout
+        stream = self._stream_uncached(prompt, response_model, timeout, tier)
         try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("response", "")
-        except Exception as e:
-             raise RuntimeError(f"Ollama generation failed: {str(e)}")
-
-    else:
-        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+            while True:
+                left = None if ends_at is None else ends_at - time.monotonic()
+                if left is not None and left <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    part = await asyncio.wait_for(stream.__anext__(), left)
+                except StopAsyncIteration:
+                    return
+                yield part
+        finally:
+            await stream.aclose()
+
+    async def _generate_within(
+        self, prompt: str, response_model: Any, timeout: Optional[float], tier: Optional[str]
+    ) -> str:
+        # Clipped after admission, so time queued on the limiter counts against the deadline
+        timeout = deadline.clip(timeout)
+        return await asyncio.wait_for(self._generate_uncached(prompt, response_model, timeout, tier), timeout)
+
+    async def _generate_uncached(
+        self, prompt: str, response_model: Any = None, timeout: Optional[float] = None, tier: Optional[str] = None
+    ) -> str:
+        provider = self.provider
+
+        if provider == "gemini":
+            model = self._gemini_model(self.model_name(provider, tier))
+            try:
+                # The transport timeout ends the RPC itself, not just our wait on it
+                request_options = {"timeout": timeout} if timeout else None
+                response = await model.generate_content_async(
+                    prompt, generation_config=gemini_config(response_model), request_options=request_options
+                )
+                return response.text
+            except Exception as e:
+                raise RuntimeError(f"Gemini generation failed: {str(e)}") from e
+
+        elif provider == "ollama":
+            payload = {
+                "model": self.model_name(provider, tier),
+                "prompt": prompt,
+                "stream": False,
+                "format": ollama_format(response_model)
+            }
+
+            try:
+                response = await self._http_client().post(
+                    "/api/generate", json=payload, timeout=timeout or httpx.USE_CLIENT_DEFAULT
+                )
+                response.raise_for_status()
+                return response.json().get("response", "")
+            except Exception as e:
+                raise RuntimeError(f"Ollama generation failed: {str(e)}") from e
+
+        else:
+            raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+
+    async def _stream_uncached(
+        self, prompt: str, response_model: Any = None, timeout: Optional[float] = None, tier: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        provider = self.provider
+
+        if provider == "gemini":
+            model = self._gemini_model(self.model_name(provider, tier))
+            try:
+                request_options = {"timeout": timeout} if timeout else None
+                response = await model.generate_content_async(
+                    prompt,
+                    generation_config=gemini_config(response_model),
+                    request_options=request_options,
+                    stream=True,
+                )
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. the final finish_reason)
+                        continue
+                    if text:
+                        yield text
+            except Exception as e:
+                raise RuntimeError(f"Gemini generation failed: {str(e)}") from e
+
+        elif provider == "ollama":
+            payload = {
+                "model": self.model_name(provider, tier),
+                "prompt": prompt,
+                "stream": True,
+                "format": ollama_format(response_model)
+            }
+
+            try:
+                async with self._http_client().stream(
+                    "POST", "/api/generate", json=payload, timeout=timeout or httpx.USE_CLIENT_DEFAULT
+                ) as response:
+                    response.raise_for_status()
+                    # One JSON object per line, each carrying the next piece of text
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        data = json.loads(line)
+                        if data.get("response"):
+                            yield data["response"]
+                        if data.get("done"):
+                            break
+            except Exception as e:
+                raise RuntimeError(f"Ollama generation failed: {str(e)}") from e
+
+        else:
+            raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
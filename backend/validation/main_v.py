@@ -2,6 +2,16 @@
 Valid8 Validation Microservice
 - Uses llm_client for generation
 - LLM agnostic (Gemini / Ollama via env vars)
+- Per-provider outcomes; completed results are checkpointed per X-Job-Id
+- /npi/prefetch warms the NPI cache from numbers found in the raw upload
+- X-Deadline-Ms bounds the whole request; retries shrink to what is left
+- Prompts carry only the compared fields in canonical JSON after one shared
+  prefix; output is schema-constrained (ValidationBatchOutput)
+- Fast model tier first; only results below LLM_ESCALATION_THRESHOLD or
+  breaking a critical rule go to the strong tier, counted per request
+- Batch responses are streamed and parsed incrementally (json_stream); each
+  result is checkpointed as it closes and a cut-off response keeps its
+  complete results
 """
 
 import os
@@ -11,23 +21,54 @@ from dotenv import load_dotenv
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"), override=True)
 
 import json
-import re
+import random
 import asyncio
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Tuple, AsyncIterator
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-
-# --- REFACTOR: Import generate from local llm_client ---
-from llm_client import generate
-from npi_lookup_api import fetch_npi
+from pydantic import BaseModel, create_model
+
+# --- REFACTOR: Import the shared async LLM client ---
+from llm_client import LLMClient, LLM_ESCALATION_THRESHOLD, TIER_FAST, TIER_STRONG
+from llm_cache import cache_stats
+from json_stream import RecordStream
+from npi_lookup_api import (
+    fetch_npi, prefetch_npis, is_valid_npi, npi_stats, aclose as close_npi_client, NPI_PREFETCH_MAX,
+)
+from rule_engine import evaluate_provider, CONFIDENCE_FIELDS
+from rate_limit import LLM_LIMITER, limiter_snapshots
+from checkpoint_store import get_checkpoints, checkpoint_stats, provider_key, run_expiry
+import deadline
+from deadline import DeadlineMiddleware, DeadlineExceeded
 
 # -----------------------------------------------------------------------------
 # CONFIG
 # -----------------------------------------------------------------------------
 RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
 LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120.0"))
+# Reported on /health; the orchestrator's dedupe treats a change as a new pipeline.
+# Bump when prompts or cleaning rules change.
+PIPELINE_VERSION = os.getenv("PIPELINE_VERSION", "1")
+# Deterministic comparison; only ambiguous records are sent to the LLM
+RULE_ENGINE_ENABLED = os.getenv("RULE_ENGINE_ENABLED", "true").lower() == "true"
+# Escalated providers are validated N per LLM request, bounded by a token budget
+VALIDATION_BATCH_SIZE = int(os.getenv("VALIDATION_BATCH_SIZE", "10"))
+VALIDATION_BATCH_TOKEN_BUDGET = int(os.getenv("VALIDATION_BATCH_TOKEN_BUDGET", "6000"))
+VALIDATION_BATCH_RETRY_ROUNDS = int(os.getenv("VALIDATION_BATCH_RETRY_ROUNDS", "2"))
+CHARS_PER_TOKEN = 4
+
+# Fast tier (flash) first; unsure results escalate to GEMINI_VALIDATION_MODEL (pro)
+LLM = LLMClient(
+    gemini_models={
+        TIER_FAST: ("GEMINI_VALIDATION_FAST_MODEL", "gemini-1.5-flash"),
+        TIER_STRONG: ("GEMINI_VALIDATION_MODEL", "gemini-1.5-pro"),
+    },
+    default_tier=TIER_STRONG,
+    limiter=LLM_LIMITER,
+)
 
 # -----------------------------------------------------------------------------
 # Pydantic Models
@@ -40,20 +81,64 @@ class ValidationResult(BaseModel):
     requires_manual_review: bool
 
 
+# Structured output for LLM validation. Gemini rejects free-form objects in a
+# response schema, so ValidationResult's dicts get one optional property per
+# validated field; unset ones come back null and are dropped on parse.
+FieldValues = create_model("FieldValues", **{f: (Optional[str], None) for f in CONFIDENCE_FIELDS})
+FieldScores = create_model("FieldScores", **{f: (Optional[float], None) for f in CONFIDENCE_FIELDS})
+
+
+class ValidationOutput(BaseModel):
+    id: str
+    updated_fields: FieldValues
+    discrepancies: List[str]
+    confidence_scores: FieldScores
+    validation_notes: List[str]
+    requires_manual_review: bool
+
+
+class ValidationBatchOutput(BaseModel):
+    results: List[ValidationOutput]
+
+
+class ProviderOutcome(BaseModel):
+    index: int
+    status: str      # "success", "error", "skipped"
+    result: Optional[ValidationResult] = None
+    error: Optional[str] = None
+    checkpointed: bool = False
+
+
 class ValidationResponse(BaseModel):
-    status: str
+    status: str      # "success", or "partial" when any provider errored
+    # Aligned with the request; errored/skipped providers get a manual-review placeholder
     validated: List[ValidationResult]
+    outcomes: List[ProviderOutcome] = []
+    # LLM results per model tier, plus fast-tier results escalated to the strong tier
+    routing: Dict[str, int] = {}
 
 
 # -----------------------------------------------------------------------------
 # FastAPI App
 # -----------------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    expiry = asyncio.create_task(run_expiry())
+    yield
+    expiry.cancel()
+    await LLM.aclose()
+    await close_npi_client()
+
+
 app = FastAPI(
     title="Valid8 Validation",
     description="Validates provider data using agnostic LLM interface.",
-    version="1.2.0"
+    version="1.2.0",
+    lifespan=lifespan,
 )
 
+# X-Deadline-Ms from the orchestrator bounds NPI lookups and LLM calls for the request
+app.add_middleware(DeadlineMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -65,7 +150,7 @@ app.add_middleware(
 # -----------------------------------------------------------------------------
 # Prompt Template
 # -----------------------------------------------------------------------------
-VALIDATION_PROMPT = """
+VALIDATION_RULES = """
 You are a Provider Validation Agent.
 
 Your tasks:
@@ -82,116 +167,437 @@ CRITICAL RULES:
    - set requires_manual_review = true
    - set confidence_scores.npi_number = 0.0
 
-2. If EXTERNAL_REFERENCE_DATA is empty or contains "error", but an NPI was provided:
+2. If EXTERNAL_REFERENCE_DATA is empty (no registry match), but an NPI was provided:
    - add "Invalid NPI - No match found in registry" to discrepancies
    - set requires_manual_review = true
 
 3. If data matches the external reference, confidence should be high (0.9-1.0).
+"""
+
+# One prompt for single and batched calls, so every request shares this prefix
+VALIDATION_PROMPT = VALIDATION_RULES + """
+You will receive one or more providers. Each item in PROVIDERS has an "id", its
+INPUT_PROVIDER_DATA under "input" (only the fields to check; absent means missing)
+and its EXTERNAL_REFERENCE_DATA under "reference". "precomputed_field_similarity" (0-1)
+and "ambiguous" fields, when present, come from a rule-based comparison.
+Validate every item independently.
 
-Output JSON only:
-{
-  "updated_fields": {...},
-  "discrepancies": [...],
-  "confidence_scores": {...},
-  "validation_notes": [...],
-  "requires_manual_review": true/false
-}
-
-NO markdown. 
-NO explanations.
-Return ONLY JSON.
+Return {"results": [...]} with exactly one result per id: "id", "updated_fields",
+"discrepancies", "confidence_scores", "validation_notes", "requires_manual_review".
 """
 
 
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
-def robust_extract_json(content: str):
-    content = content.replace("```json", "").replace("```", "")
-    try:
-        return json.loads(content)
-    except:
-        pass
-    match = re.search(r"\{.*\}", content, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(0))
-        except:
-            pass
-    raise HTTPException(500, "LLM returned invalid JSON.")
-
-
-async def call_llm_with_retries(prompt: str) -> Dict[str, Any]:
+async def stream_llm_records(prompt: str, tier: Optional[str] = None) -> AsyncIterator[Any]:
     """
-    Calls configured LLM via llm_client.
+    Streams the LLM response through json_stream, yielding each run of
+    result records (objects with an "id") as they close, or the whole
+    document when it has none. Attempts are retried until something was
+    yielded; after that a failure or cut-off keeps what arrived and the
+    caller re-sends the rest.
     """
-    async def _call_once():
-        def blocking():
-            return generate(prompt)
-        return await asyncio.to_thread(blocking)
-
     backoff = 1
     last_error = None
 
     for attempt in range(RETRY_ATTEMPTS):
+        parser = RecordStream()
+        emitted = 0
         try:
-            raw = await asyncio.wait_for(_call_once(), timeout=LLM_TIMEOUT_SECONDS)
-            return robust_extract_json(raw)
+            # Retries skip the response cache so a bad cached answer is not replayed
+            async for text in LLM.generate_stream(
+                prompt, response_model=ValidationBatchOutput, use_cache=attempt == 0,
+                timeout=LLM_TIMEOUT_SECONDS, tier=tier,
+            ):
+                records = [r for r in parser.feed(text) if isinstance(r, dict) and "id" in r]
+                if records:
+                    emitted += len(records)
+                    yield records
+            if not emitted:
+                try:
+                    document = parser.document()
+                except ValueError:
+                    await LLM.invalidate(prompt, ValidationBatchOutput, tier)
+                    raise
+                yield document
+            if not parser.complete:
+                await LLM.invalidate(prompt, ValidationBatchOutput, tier)
+                print(f"[VALIDATION] LLM response cut off after {emitted} results; re-sending the rest")
+            return
         except Exception as e:
+            if emitted:
+                raise HTTPException(500, f"LLM stream failed after {emitted} results: {e}")
             last_error = e
+            if isinstance(e, DeadlineExceeded):
+                break
+            delay = backoff * random.uniform(0.5, 1.5)
             if attempt < RETRY_ATTEMPTS - 1:
-                await asyncio.sleep(backoff)
+                if not deadline.can_wait(delay):
+                    break
+                # Jitter so batches throttled together do not retry in lockstep
+                await asyncio.sleep(delay)
                 backoff *= 2
-    
+
     raise HTTPException(500, f"LLM failed after retries: {last_error}")
 
 
 # -----------------------------------------------------------------------------
 # Validation Logic
 # -----------------------------------------------------------------------------
-async def validate_single_provider(provider: dict) -> ValidationResult:
-    # Step 1 — Fetch NPI reference data
+@dataclass
+class PendingValidation:
+    id: str
+    provider: dict
+    npi_data: Any
+    field_scores: Dict[str, float] = field(default_factory=dict)
+    ambiguous_fields: List[str] = field(default_factory=list)
+
+    def to_item(self) -> dict:
+        item = {"id": self.id, "input": compact_provider(self.provider), "reference": compact_reference(self.npi_data)}
+        if self.field_scores:
+            item["precomputed_field_similarity"] = {k: round(v, 2) for k, v in self.field_scores.items()}
+        if self.ambiguous_fields:
+            item["ambiguous"] = self.ambiguous_fields
+        return item
+
+
+def compact_provider(provider: dict) -> dict:
+    """Only the fields validation compares: no confidences, notes, row numbers or earlier results."""
+    return {f: provider[f] for f in CONFIDENCE_FIELDS if provider.get(f) not in (None, "")}
+
+
+def compact_reference(npi_data: Any) -> Any:
+    if not isinstance(npi_data, dict):
+        return npi_data
+    return {k: v for k, v in npi_data.items() if k != "source" and v not in (None, "")}
+
+
+def canonical_json(value: Any) -> str:
+    # Sorted keys and no padding: fewer tokens, and identical input renders identically
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+async def prepare_provider(provider: dict, item_id: str) -> Any:
+    """
+    Fetches NPI reference data and runs the rule engine. Returns a
+    ValidationResult when the rules are decisive, else a PendingValidation
+    for the LLM.
+    """
+    # Step 1 — Fetch NPI reference data. A failed lookup raises, so the
+    # provider becomes a re-submittable "error" outcome instead of a verdict.
     npi_data = {}
     if provider.get("npi_number"):
+        npi_data = await fetch_npi(provider["npi_number"]) or {}
+
+    # Step 2 — Rule engine; decisive verdicts never reach the LLM
+    if not RULE_ENGINE_ENABLED:
+        return PendingValidation(id=item_id, provider=provider, npi_data=npi_data)
+    verdict = evaluate_provider(provider, npi_data)
+    if verdict.result is not None:
+        return ValidationResult(**verdict.result)
+    return PendingValidation(
+        id=item_id,
+        provider=provider,
+        npi_data=npi_data,
+        field_scores=verdict.field_scores,
+        ambiguous_fields=verdict.ambiguous_fields,
+    )
+
+
+def build_validation_prompt(batch: List[PendingValidation]) -> str:
+    items = "\n".join(canonical_json(p.to_item()) for p in batch)
+    return f"""{VALIDATION_PROMPT}
+PROVIDERS (one JSON object per line):
+{items}
+"""
+
+
+def pack_batches(pending: List[PendingValidation], max_items: int) -> List[List[PendingValidation]]:
+    """Greedy packing by item count and estimated prompt tokens."""
+    base_tokens = len(VALIDATION_PROMPT) // CHARS_PER_TOKEN
+    batches: List[List[PendingValidation]] = []
+    current: List[PendingValidation] = []
+    used = base_tokens
+    for p in pending:
+        tokens = len(canonical_json(p.to_item())) // CHARS_PER_TOKEN + 1
+        if current and (len(current) >= max_items or used + tokens > VALIDATION_BATCH_TOKEN_BUDGET):
+            batches.append(current)
+            current, used = [], base_tokens
+        current.append(p)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_results(batch: List[PendingValidation], response: Any) -> Dict[str, ValidationResult]:
+    """Maps a (possibly partial) LLM response back to item ids; bad entries are skipped."""
+    if len(batch) == 1 and isinstance(response, dict) and "results" not in response:
+        entries = [dict(response, id=batch[0].id)]
+    elif isinstance(response, list):
+        entries = response
+    elif isinstance(response, dict):
+        entries = response.get("results")
+        if not isinstance(entries, list):
+            entries = next((v for v in response.values() if isinstance(v, list)), [])
+    else:
+        entries = []
+
+    wanted = {p.id for p in batch}
+    parsed: Dict[str, ValidationResult] = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or str(entry.get("id")) not in wanted:
+            continue
+        fields = {k: v for k, v in entry.items() if k != "id"}
+        for name in ("updated_fields", "confidence_scores"):
+            if isinstance(fields.get(name), dict):
+                # Structured output lists every field; unset ones come back null
+                fields[name] = {k: v for k, v in fields[name].items() if v is not None}
         try:
-            npi_data = fetch_npi(provider["npi_number"])
+            parsed[str(entry["id"])] = ValidationResult(**fields)
         except Exception as e:
-            npi_data = {"error": str(e)}
+            print(f"[VALIDATION] Dropping malformed result for {entry.get('id')}: {e}")
+    return parsed
 
-    # Step 2 — Construct prompt
-    prompt = f"""
-{VALIDATION_PROMPT}
 
-INPUT_PROVIDER_DATA:
-{json.dumps(provider)}
+def needs_escalation(pending: PendingValidation, result: ValidationResult) -> bool:
+    """
+    Whether a fast-tier result should be redone on the strong tier: it breaks
+    a critical rule, or scores a field the provider has below
+    LLM_ESCALATION_THRESHOLD.
+    """
+    provider = compact_provider(pending.provider)
+    reference = pending.npi_data
+    if ("npi_number" not in provider or not reference) and not result.requires_manual_review:
+        return True
+    for name in provider:
+        score = result.confidence_scores.get(name)
+        if not isinstance(score, (int, float)) or not LLM_ESCALATION_THRESHOLD <= score <= 1.0:
+            return True
+    return False
+
+
+async def validate_on_tier(
+    pending: List[PendingValidation],
+    tier: str,
+    escalate: bool,
+    on_results: Optional[Callable[[Dict[str, ValidationResult]], None]] = None,
+) -> Tuple[Dict[str, ValidationResult], List[PendingValidation], Any]:
+    """
+    Batched LLM validation on one model tier. Items missing from a partial,
+    cut-off or malformed response are re-sent, in smaller batches, for up to
+    VALIDATION_BATCH_RETRY_ROUNDS extra rounds. With `escalate`, results that
+    need_escalation are set aside instead of accepted. Returns (accepted
+    results, escalated items, last error).
+    """
+    results: Dict[str, ValidationResult] = {}
+    escalated: Dict[str, PendingValidation] = {}
+    remaining = list(pending)
+    max_items = max(1, VALIDATION_BATCH_SIZE)
+    last_error = None
 
-EXTERNAL_REFERENCE_DATA:
-{json.dumps(npi_data)}
-"""
+    for round_no in range(VALIDATION_BATCH_RETRY_ROUNDS + 1):
+        batches = pack_batches(remaining, max_items)
+
+        async def _run(batch: List[PendingValidation]) -> None:
+            by_id = {p.id: p for p in batch}
+            # Results are kept (and checkpointed) as each one closes, even if the stream later fails
+            async for response in stream_llm_records(build_validation_prompt(batch), tier):
+                parsed = {}
+                for item_id, result in parse_batch_results(batch, response).items():
+                    if escalate and needs_escalation(by_id[item_id], result):
+                        escalated[item_id] = by_id[item_id]
+                    else:
+                        parsed[item_id] = result
+                results.update(parsed)
+                if on_results and parsed:
+                    on_results(parsed)
+
+        outcomes = await asyncio.gather(*(_run(b) for b in batches), return_exceptions=True)
+        last_error = next((o for o in outcomes if isinstance(o, Exception)), last_error)
+
+        remaining = [p for p in remaining if p.id not in results and p.id not in escalated]
+        if not remaining:
+            break
+        print(f"[VALIDATION] Round {round_no + 1} ({tier}): {len(remaining)} providers missing from batch responses")
+        max_items = max(1, max_items // 2)
+
+    return results, list(escalated.values()), last_error
+
+
+async def validate_with_llm(
+    pending: List[PendingValidation],
+    on_results: Optional[Callable[[Dict[str, ValidationResult]], None]] = None,
+    routing: Optional[Dict[str, int]] = None,
+) -> Tuple[Dict[str, ValidationResult], Dict[str, str]]:
+    """
+    Validates escalated providers through the model tiers in order: with
+    routing on, the fast tier answers what it is sure of and only the rest
+    (escalated or failed) goes to the strong tier. Returns (results, errors)
+    by item id; `on_results` sees results as soon as each one parses and
+    `routing` receives the per-tier counts.
+    """
+    routing = routing if routing is not None else {}
+    results: Dict[str, ValidationResult] = {}
+    remaining = list(pending)
+    last_error = None
+    tiers = LLM.tiers()
+
+    for n, tier in enumerate(tiers):
+        escalate = n < len(tiers) - 1
+        accepted, escalated, error = await validate_on_tier(remaining, tier, escalate, on_results)
+        results.update(accepted)
+        last_error = error or last_error
+        routing[tier] = routing.get(tier, 0) + len(accepted)
+        if escalated:
+            routing["escalated"] = routing.get("escalated", 0) + len(escalated)
+        remaining = [p for p in remaining if p.id not in results]
+        if not remaining:
+            break
+
+    detail = str(getattr(last_error, "detail", last_error) or "missing from LLM response")
+    if remaining:
+        print(f"[VALIDATION ERROR] LLM validation failed for {len(remaining)} providers: {detail}")
+    return results, {p.id: detail for p in remaining}
+
+
+def placeholder_result(reason: str) -> ValidationResult:
+    """Stands in for a provider that could not be validated, so a human looks at it."""
+    return ValidationResult(
+        updated_fields={},
+        discrepancies=[reason],
+        confidence_scores={},
+        validation_notes=[reason],
+        requires_manual_review=True,
+    )
 
-    # Step 3 — LLM Validation
-    result = await call_llm_with_retries(prompt)
-    return ValidationResult(**result)
+
+def _is_empty(provider: Any) -> bool:
+    return not isinstance(provider, dict) or not any(
+        v not in (None, "", [], {}) for v in provider.values()
+    )
 
 
 # -----------------------------------------------------------------------------
 # API Endpoints
 # -----------------------------------------------------------------------------
 @app.post("/validate", response_model=ValidationResponse)
-async def validate_providers(providers: List[dict]):
-    tasks = [validate_single_provider(p) for p in providers]
-    results = await asyncio.gather(*tasks)
+async def validate_providers(providers: List[dict], x_job_id: Optional[str] = Header(None)):
+    """
+    Validates each provider independently: one failure never fails the batch.
+    With an X-Job-Id header, completed results are checkpointed and returned
+    as-is when the same provider is re-submitted for that job.
+    """
+    store = get_checkpoints() if x_job_id else None
+    keys = [provider_key(p) for p in providers]
+    done = await asyncio.to_thread(store.load, x_job_id, keys) if store else {}
+    # Checkpoint writes run on worker threads as results arrive; awaited before responding
+    saves: List[asyncio.Future] = []
+
+    def checkpoint(items: List[Tuple[int, ValidationResult]]) -> None:
+        if store and items:
+            rows = [(keys[i], r.model_dump()) for i, r in items]
+            saves.append(asyncio.ensure_future(asyncio.to_thread(store.save, x_job_id, rows)))
+
+    outcomes: Dict[int, ProviderOutcome] = {}
+    todo: List[int] = []
+    for i, provider in enumerate(providers):
+        if keys[i] in done:
+            outcomes[i] = ProviderOutcome(
+                index=i, status="success", result=ValidationResult(**done[keys[i]]), checkpointed=True
+            )
+        elif _is_empty(provider):
+            outcomes[i] = ProviderOutcome(index=i, status="skipped", error="Empty provider record")
+        else:
+            todo.append(i)
+
+    # Step 1 — NPI lookup + rules, isolated per provider
+    prepared = await asyncio.gather(
+        *(prepare_provider(providers[i], f"p{i}") for i in todo), return_exceptions=True
+    )
+    pending: List[PendingValidation] = []
+    decided: List[Tuple[int, ValidationResult]] = []
+    for i, item in zip(todo, prepared):
+        if isinstance(item, Exception):
+            print(f"[VALIDATION ERROR] Provider {i}: {item}")
+            outcomes[i] = ProviderOutcome(index=i, status="error", error=str(item))
+        elif isinstance(item, PendingValidation):
+            pending.append(item)
+        else:
+            outcomes[i] = ProviderOutcome(index=i, status="success", result=item)
+            decided.append((i, item))
+    checkpoint(decided)
+
+    # Step 2 — LLM for the ambiguous rest, checkpointed batch by batch
+    index_of = {p.id: int(p.id[1:]) for p in pending}
+    llm_results, llm_errors = {}, {}
+    routing: Dict[str, int] = {}
+    if pending:
+        llm_results, llm_errors = await validate_with_llm(
+            pending,
+            on_results=lambda batch: checkpoint([(index_of[k], r) for k, r in batch.items()]),
+            routing=routing,
+        )
+    for item_id, result in llm_results.items():
+        outcomes[index_of[item_id]] = ProviderOutcome(index=index_of[item_id], status="success", result=result)
+    for item_id, error in llm_errors.items():
+        outcomes[index_of[item_id]] = ProviderOutcome(index=index_of[item_id], status="error", error=error)
+
+    for saved in await asyncio.gather(*saves, return_exceptions=True):
+        if isinstance(saved, Exception):
+            print(f"[VALIDATION ERROR] Checkpoint write failed: {saved}")
+
+    ordered = [outcomes[i] for i in range(len(providers))]
+    validated = [
+        o.result if o.status == "success" else placeholder_result(f"Validation {o.status}: {o.error}")
+        for o in ordered
+    ]
     return ValidationResponse(
-        status="success",
-        validated=results
+        status="partial" if any(o.status == "error" for o in ordered) else "success",
+        validated=validated,
+        outcomes=ordered,
+        routing=routing,
     )
 
 
+@app.post("/npi/prefetch", status_code=202)
+async def prefetch(npi_numbers: List[str]):
+    """
+    Warms the NPI cache for numbers an upcoming /validate call will need; the
+    orchestrator sends those it finds in a raw upload. Returns at once; the
+    lookups run in the background at low priority, behind live /validate
+    lookups. Invalid numbers are ignored.
+    """
+    valid = [n for n in dict.fromkeys(str(x).strip() for x in npi_numbers[:NPI_PREFETCH_MAX]) if is_valid_npi(n)]
+    return {"received": len(npi_numbers), "valid": len(valid), "queued": prefetch_npis(valid)}
+
+
+def pipeline_config() -> Dict[str, Any]:
+    return {
+        "service": "valid8-validation",
+        "version": app.version,
+        "pipeline_version": PIPELINE_VERSION,
+        "llm_provider": os.getenv("LLM_PROVIDER", "gemini"),
+        "llm_routing": LLM.routing_snapshot(),
+    }
+
+
+@app.get("/config")
+async def config():
+    """What shapes this service's output, without stats; the orchestrator fingerprints it for dedupe."""
+    return pipeline_config()
+
+
 @app.get("/health")
 async def health():
     return {
         "status": "healthy",
-        "llm_provider": os.getenv("LLM_PROVIDER", "gemini")
+        **pipeline_config(),
+        "llm_cache": cache_stats(),
+        "npi_cache": npi_stats(),
+        "rate_limits": limiter_snapshots(),
+        "checkpoints": checkpoint_stats(),
     }
 
 
@@ -0,0 +1,358 @@
+"""
+Offline NPI index built from the NPPES dissemination file.
+- Streams the (multi-GB) NPPES CSV into a compact SQLite table keyed by NPI
+- Applies weekly incremental files as upserts; deactivated NPIs are removed
+- Lookups return the same dict shape as the registry API client; specialty is
+  None when the taxonomy code has no imported description, so it is not
+  compared against a human-readable specialty
+- One connection per index, guarded by a lock; callers may use threads
+
+Usage:
+    python npi_index.py import npidata_pfile_20050523-20240707.csv
+    python npi_index.py delta npidata_pfile_20240708-20240714.csv
+    python npi_index.py taxonomy nucc_taxonomy_241.csv
+    python npi_index.py lookup 1234567890
+"""
+
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+NPI_INDEX_PATH = os.getenv("NPI_INDEX_PATH", os.path.join(os.path.dirname(__file__), "npi_index.sqlite3"))
+IMPORT_BATCH_SIZE = 10_000
+TAXONOMY_SLOTS = 15
+REOPEN_CHECK_SECONDS = 30.0
+
+COL_NPI = "NPI"
+COL_ENTITY_TYPE = "Entity Type Code"
+COL_ORG_NAME = "Provider Organization Name (Legal Business Name)"
+COL_NAME_PARTS = [
+    "Provider Name Prefix Text",
+    "Provider First Name",
+    "Provider Middle Name",
+    "Provider Last Name (Legal Name)",
+    "Provider Credential Text",
+]
+COL_ADDRESS_PARTS = [
+    "Provider First Line Business Practice Location Address",
+    "Provider Second Line Business Practice Location Address",
+    "Provider Business Practice Location Address City Name",
+    "Provider Business Practice Location Address State Name",
+    "Provider Business Practice Location Address Postal Code",
+]
+COL_PHONE = "Provider Business Practice Location Address Telephone Number"
+COL_DEACTIVATED = "NPI Deactivation Date"
+COL_REACTIVATED = "NPI Reactivation Date"
+COL_TAXONOMY = "Healthcare Provider Taxonomy Code_{}"
+COL_LICENSE = "Provider License Number_{}"
+COL_PRIMARY = "Healthcare Provider Primary Taxonomy Switch_{}"
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS providers (
+        npi INTEGER PRIMARY KEY,
+        full_name TEXT,
+        taxonomy_code TEXT,
+        address TEXT,
+        phone TEXT,
+        license_number TEXT
+    )""",
+    "CREATE TABLE IF NOT EXISTS taxonomy (code TEXT PRIMARY KEY, description TEXT)",
+    """CREATE TABLE IF NOT EXISTS imports (
+        file TEXT, kind TEXT, upserted INTEGER, deleted INTEGER, imported_at REAL
+    )""",
+]
+
+
+# -----------------------------------------------------------------------------
+# Import
+# -----------------------------------------------------------------------------
+def _format_phone(raw: str) -> Optional[str]:
+    digits = "".join(ch for ch in raw if ch.isdigit())
+    if len(digits) == 10:
+        # Same shape the registry API returns
+        return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
+    return raw or None
+
+
+def _iter_nppes_rows(csv_path: str) -> Iterator[Tuple[int, Optional[tuple]]]:
+    """
+    Yields (npi, row) for every record; row is None for deactivated NPIs.
+    Only the handful of columns we need are looked up, by header position.
+    """
+    with open(csv_path, "r", encoding="utf-8", errors="replace", newline="") as fh:
+        reader = csv.reader(fh)
+        header = next(reader)
+        pos = {name: i for i, name in enumerate(header)}
+
+        def idx(name: str) -> Optional[int]:
+            return pos.get(name)
+
+        i_npi = idx(COL_NPI)
+        if i_npi is None:
+            raise ValueError(f"{csv_path} does not look like an NPPES file (no '{COL_NPI}' column)")
+        i_entity = idx(COL_ENTITY_TYPE)
+        i_org = idx(COL_ORG_NAME)
+        i_names = [idx(c) for c in COL_NAME_PARTS]
+        i_address = [idx(c) for c in COL_ADDRESS_PARTS]
+        i_phone = idx(COL_PHONE)
+        i_deactivated = idx(COL_DEACTIVATED)
+        i_reactivated = idx(COL_REACTIVATED)
+        i_slots = [
+            (idx(COL_TAXONOMY.format(n)), idx(COL_LICENSE.format(n)), idx(COL_PRIMARY.format(n)))
+            for n in range(1, TAXONOMY_SLOTS + 1)
+        ]
+
+        def cell(row: List[str], i: Optional[int]) -> str:
+            return row[i].strip() if i is not None and i < len(row) else ""
+
+        for row in reader:
+            npi_text = cell(row, i_npi)
+            if not npi_text.isdigit():
+                continue
+            npi = int(npi_text)
+
+            if cell(row, i_deactivated) and not cell(row, i_reactivated) and not cell(row, i_entity):
+                yield npi, None
+                continue
+
+            if cell(row, i_entity) == "2":
+                full_name = cell(row, i_org)
+            else:
+                full_name = " ".join(filter(None, (cell(row, i) for i in i_names)))
+
+            # Primary taxonomy (switch = Y) wins, otherwise the first populated slot
+            taxonomy_code, license_number = None, None
+            for i_tax, i_lic, i_primary in i_slots:
+                code = cell(row, i_tax)
+                if not code:
+                    continue
+                if taxonomy_code is None or cell(row, i_primary) == "Y":
+                    taxonomy_code, license_number = code, cell(row, i_lic) or None
+                if cell(row, i_primary) == "Y":
+                    break
+
+            address = ", ".join(filter(None, (cell(row, i) for i in i_address))) or None
+            yield npi, (npi, full_name, taxonomy_code, address, _format_phone(cell(row, i_phone)), license_number)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def _apply_rows(conn: sqlite3.Connection, rows: Iterator[Tuple[int, Optional[tuple]]]) -> Tuple[int, int]:
+    upserted, deleted, batches = 0, 0, 0
+    upserts: List[tuple] = []
+    deletes: List[tuple] = []
+
+    def flush():
+        conn.executemany(
+            "INSERT OR REPLACE INTO providers (npi, full_name, taxonomy_code, address, phone, license_number) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            upserts,
+        )
+        conn.executemany("DELETE FROM providers WHERE npi = ?", deletes)
+        conn.commit()
+        upserts.clear()
+        deletes.clear()
+
+    for npi, row in rows:
+        if row is None:
+            deletes.append((npi,))
+            deleted += 1
+        else:
+            upserts.append(row)
+            upserted += 1
+        if len(upserts) + len(deletes) >= IMPORT_BATCH_SIZE:
+            flush()
+            batches += 1
+            if batches % 50 == 0:
+                print(f"[NPI INDEX] {upserted} records written...")
+    flush()
+    return upserted, deleted
+
+
+def import_full(csv_path: str, index_path: str = NPI_INDEX_PATH) -> Tuple[int, int]:
+    """
+    Builds a fresh index next to the live one and swaps it in atomically, so a
+    running validation service keeps serving the old index until it reopens.
+    """
+    building_path = index_path + ".building"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(building_path + suffix):
+            os.remove(building_path + suffix)
+
+    conn = _connect(building_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    # Carry taxonomy descriptions over from the previous index
+    if os.path.exists(index_path):
+        conn.execute("ATTACH DATABASE ? AS previous", (index_path,))
+        conn.execute("INSERT OR REPLACE INTO taxonomy SELECT code, description FROM previous.taxonomy")
+        conn.commit()
+        conn.execute("DETACH DATABASE previous")
+
+    upserted, deleted = _apply_rows(conn, _iter_nppes_rows(csv_path))
+    conn.execute(
+        "INSERT INTO imports VALUES (?, 'full', ?, ?, ?)",
+        (os.path.basename(csv_path), upserted, deleted, time.time()),
+    )
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+    os.replace(building_path, index_path)
+    return upserted, deleted
+
+
+def import_delta(csv_path: str, index_path: str = NPI_INDEX_PATH) -> Tuple[int, int]:
+    """Applies a weekly incremental NPPES file in place."""
+    conn = _connect(index_path)
+    upserted, deleted = _apply_rows(conn, _iter_nppes_rows(csv_path))
+    conn.execute(
+        "INSERT INTO imports VALUES (?, 'delta', ?, ?, ?)",
+        (os.path.basename(csv_path), upserted, deleted, time.time()),
+    )
+    conn.commit()
+    conn.close()
+    return upserted, deleted
+
+
+def import_taxonomy(csv_path: str, index_path: str = NPI_INDEX_PATH) -> int:
+    """Loads NUCC taxonomy code descriptions (the NPPES file only carries codes)."""
+    conn = _connect(index_path)
+    rows = []
+    with open(csv_path, "r", encoding="utf-8-sig", errors="replace", newline="") as fh:
+        for record in csv.DictReader(fh):
+            code = (record.get("Code") or "").strip()
+            if not code:
+                continue
+            classification = (record.get("Classification") or "").strip()
+            specialization = (record.get("Specialization") or "").strip()
+            description = ", ".join(filter(None, [classification, specialization]))
+            rows.append((code, description or (record.get("Display Name") or "").strip() or None))
+    conn.executemany("INSERT OR REPLACE INTO taxonomy (code, description) VALUES (?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+# -----------------------------------------------------------------------------
+# Lookup
+# -----------------------------------------------------------------------------
+class NPIIndex:
+    def __init__(self, path: str = NPI_INDEX_PATH):
+        self.path = path
+        self.lookups = 0
+        self.found = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inode: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA query_only=1")
+        self._inode = os.stat(self.path).st_ino
+        self._checked_at = time.monotonic()
+
+    def _maybe_reopen(self) -> None:
+        # Pick up a freshly swapped-in full import without restarting the service
+        now = time.monotonic()
+        if now - self._checked_at < REOPEN_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            if os.stat(self.path).st_ino != self._inode:
+                self._open()
+        except OSError:
+            pass
+
+    def lookup(self, npi_number: Any) -> Optional[Dict[str, Any]]:
+        try:
+            npi = int(str(npi_number).strip())
+        except ValueError:
+            self.lookups += 1
+            return None
+
+        with self._lock:
+            self._maybe_reopen()
+            self.lookups += 1
+            # A bare taxonomy code would read as a specialty mismatch, so it stays None
+            row = self._conn.execute(
+                """SELECT p.full_name, t.description, p.address, p.phone, p.license_number
+                   FROM providers p LEFT JOIN taxonomy t ON t.code = p.taxonomy_code
+                   WHERE p.npi = ?""",
+                (npi,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.found += 1
+        return {
+            "full_name": row[0] or "",
+            "specialty": row[1],
+            "address": row[2],
+            "phone": row[3],
+            "license_number": row[4],
+            "npi_number": str(npi_number).strip(),
+            "source": "NPPES Local Index",
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            last_import = self._conn.execute(
+                "SELECT file, kind, imported_at FROM imports ORDER BY imported_at DESC LIMIT 1"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "lookups": self.lookups,
+            "found": self.found,
+            "last_import": (
+                {"file": last_import[0], "kind": last_import[1], "imported_at": last_import[2]}
+                if last_import else None
+            ),
+        }
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build and query the offline NPPES index.")
+    parser.add_argument("--db", default=NPI_INDEX_PATH, help="Index path (default: NPI_INDEX_PATH)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import", help="Full rebuild from an NPPES dissemination CSV").add_argument("csv")
+    sub.add_parser("delta", help="Apply a weekly incremental NPPES CSV").add_argument("csv")
+    sub.add_parser("taxonomy", help="Load NUCC taxonomy descriptions").add_argument("csv")
+    sub.add_parser("lookup", help="Look up one NPI").add_argument("npi")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    if args.command == "import":
+        upserted, deleted = import_full(args.csv, args.db)
+        print(f"[NPI INDEX] Imported {upserted} records ({deleted} deactivated) in {time.time() - started:.1f}s")
+    elif args.command == "delta":
+        upserted, deleted = import_delta(args.csv, args.db)
+        print(f"[NPI INDEX] Applied delta: {upserted} upserted, {deleted} removed in {time.time() - started:.1f}s")
+    elif args.command == "taxonomy":
+        print(f"[NPI INDEX] Loaded {import_taxonomy(args.csv, args.db)} taxonomy codes")
+    elif args.command == "lookup":
+        print(NPIIndex(args.db).lookup(args.npi))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,83 @@
-import requests
+"""
+Async NPI Registry client.
+- One pooled httpx.AsyncClient with per-request timeouts
+- Bounded TTL + LRU cache of parsed results, including negative (not found) entries
+- Single-flight: concurrent lookups for the same NPI share one request
+- Registry calls go through rate_limit.NPI_LIMITER (token bucket + AIMD concurrency)
+- Request timeouts are clipped to the caller's deadline (deadline.py)
+- Optional offline backend (npi_index) served before, or instead of, the API;
+  its SQLite lookups run on a worker thread
+- prefetch() queues NPIs expected soon (found in a raw upload by the
+  orchestrator) for a few background workers; they are admitted by
+  NPI_LIMITER only when no live lookup is waiting, so prefetch never delays
+  fetch(). Later fetches join a running prefetch or hit the cache
+"""
 
-def fetch_npi(npi_number):
-    url = f"https://npiregistry.cms.hhs.gov/api/?number={npi_number}&version=2.1"
-    resp = requests.get(url).json()
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, Optional, Set, Tuple
 
-    if "results" not in resp or not resp["results"]:
-        return None
+import httpx
 
-    result = resp["results"][0]
+import deadline
+from npi_index import NPIIndex, NPI_INDEX_PATH
+from rate_limit import NPI_LIMITER
 
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+# "api" (registry only), "local" (offline index only) or "local_then_api"
+NPI_BACKEND = os.getenv("NPI_BACKEND", "api").lower()
+NPI_API_URL = os.getenv("NPI_API_URL", "https://npiregistry.cms.hhs.gov/api/")
+NPI_TIMEOUT_SECONDS = float(os.getenv("NPI_TIMEOUT_SECONDS", "10.0"))
+NPI_MAX_CONNECTIONS = int(os.getenv("NPI_MAX_CONNECTIONS", "20"))
+NPI_CACHE_SIZE = int(os.getenv("NPI_CACHE_SIZE", "50000"))
+NPI_CACHE_TTL_SECONDS = float(os.getenv("NPI_CACHE_TTL_SECONDS", str(24 * 3600)))
+NPI_NEGATIVE_TTL_SECONDS = float(os.getenv("NPI_NEGATIVE_TTL_SECONDS", "3600"))
+# Most NPIs accepted by one prefetch request, and most queued at once
+NPI_PREFETCH_MAX = int(os.getenv("NPI_PREFETCH_MAX", "5000"))
+# Background lookups running at once
+NPI_PREFETCH_WORKERS = int(os.getenv("NPI_PREFETCH_WORKERS", "2"))
+
+
+# -----------------------------------------------------------------------------
+# Cache
+# -----------------------------------------------------------------------------
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a per-entry TTL."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# -----------------------------------------------------------------------------
+# Parsing
+# -----------------------------------------------------------------------------
+def parse_npi_result(result: Dict[str, Any], npi_number: str) -> Dict[str, Any]:
     basic = result.get("basic", {})
     addresses = result.get("addresses", [])
     taxonomies = result.get("taxonomies", [])
@@ -56,3 +125,207 @@ def fetch_npi(npi_number):
         "npi_number": npi_number,
         "source": "NPI Registry API"
     }
+
+
+# -----------------------------------------------------------------------------
+# Client
+# -----------------------------------------------------------------------------
+class NPIClient:
+    def __init__(self):
+        self._cache = TTLCache(NPI_CACHE_SIZE)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._prefetch_queue: Deque[str] = deque()
+        self._prefetch_workers: Set[asyncio.Task] = set()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._index: Optional[NPIIndex] = None
+        if NPI_BACKEND in ("local", "local_then_api"):
+            if os.path.exists(NPI_INDEX_PATH):
+                self._index = NPIIndex(NPI_INDEX_PATH)
+            else:
+                print(f"[VALIDATION] NPI_BACKEND={NPI_BACKEND} but no index at {NPI_INDEX_PATH}; using the API")
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.errors = 0
+        self.prefetched = 0
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(NPI_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=NPI_MAX_CONNECTIONS,
+                    max_keepalive_connections=NPI_MAX_CONNECTIONS,
+                ),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def fetch(self, npi_number: Any) -> Optional[Dict[str, Any]]:
+        key = str(npi_number).strip()
+        if self._index is not None:
+            record = await asyncio.to_thread(self._index.lookup, key)
+            if record is not None or NPI_BACKEND == "local":
+                return record
+
+        found, value = self._cache.get(key)
+        if found:
+            if value is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.deduplicated += 1
+
+        # Shield so one cancelled caller does not cancel the lookup for the others
+        return await asyncio.shield(task)
+
+    def prefetch(self, numbers: Iterable[str]) -> int:
+        """
+        Queues background lookups for NPIs that are not cached, in flight or
+        already queued; returns how many were queued. Workers skip those the
+        local index has.
+        """
+        queued = 0
+        waiting = set(self._prefetch_queue)
+        for number in numbers:
+            if len(self._prefetch_queue) >= NPI_PREFETCH_MAX:
+                break
+            key = str(number).strip()
+            if key in waiting or self._known(key):
+                continue
+            self._prefetch_queue.append(key)
+            waiting.add(key)
+            queued += 1
+        self.prefetched += queued
+
+        loop = asyncio.get_running_loop()
+        while self._prefetch_queue and len(self._prefetch_workers) < NPI_PREFETCH_WORKERS:
+            # A fresh context, so a deadline on the prefetch request does not carry over
+            worker = loop.create_task(self._prefetch_worker(), context=contextvars.Context())
+            self._prefetch_workers.add(worker)
+            worker.add_done_callback(self._prefetch_workers.discard)
+        return queued
+
+    def _known(self, key: str) -> bool:
+        """Whether `key` is cached or already being looked up."""
+        return key in self._inflight or self._cache.get(key)[0]
+
+    async def _indexed(self, key: str) -> bool:
+        """Whether a fetch for `key` would be answered by the local index."""
+        if self._index is None:
+            return False
+        return NPI_BACKEND == "local" or await asyncio.to_thread(self._index.lookup, key) is not None
+
+    async def _prefetch_worker(self) -> None:
+        while self._prefetch_queue:
+            key = self._prefetch_queue.popleft()
+            if self._known(key) or await self._indexed(key):
+                continue
+            try:
+                async with NPI_LIMITER.slot(background=True):
+                    # A live fetch may have started this lookup while we waited
+                    if self._known(key):
+                        continue
+                    task = asyncio.ensure_future(self._request(key))
+                    self._inflight[key] = task
+                    task.add_done_callback(lambda t, key=key: self._finish(key, t))
+                    await asyncio.shield(task)
+            except Exception:
+                # Counted in errors; fetch() retries it on the critical path
+                pass
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved even if every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, npi_number: str) -> Optional[Dict[str, Any]]:
+        deadline.budget(NPI_TIMEOUT_SECONDS)
+        async with NPI_LIMITER.slot():
+            return await self._request(npi_number)
+
+    async def _request(self, npi_number: str) -> Optional[Dict[str, Any]]:
+        """One registry call; the caller holds an NPI_LIMITER slot."""
+        try:
+            resp = await self._http_client().get(
+                NPI_API_URL, params={"number": npi_number, "version": "2.1"},
+                timeout=deadline.clip(NPI_TIMEOUT_SECONDS),
+            )
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception:
+            # Transient failures are not cached
+            self.errors += 1
+            raise
+
+        if "results" not in data or not data["results"]:
+            self._cache.set(npi_number, None, NPI_NEGATIVE_TTL_SECONDS)
+            return None
+
+        parsed = parse_npi_result(data["results"][0], npi_number)
+        self._cache.set(npi_number, parsed, NPI_CACHE_TTL_SECONDS)
+        return parsed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "errors": self.errors,
+            "prefetched": self.prefetched,
+            "prefetch_queued": len(self._prefetch_queue),
+            "in_flight": len(self._inflight),
+            "backend": NPI_BACKEND if self._index is not None else "api",
+            "local_index": self._index.stats() if self._index is not None else None,
+        }
+
+
+_client = NPIClient()
+
+
+async def fetch_npi(npi_number):
+    return await _client.fetch(npi_number)
+
+
+def prefetch_npis(npi_numbers: Iterable[str]) -> int:
+    return _client.prefetch(npi_numbers)
+
+
+def is_valid_npi(npi: str) -> bool:
+    """NPI check digit: Luhn over the number prefixed with the 80840 issuer code."""
+    if len(npi) != 10 or not npi.isdigit() or npi[0] not in "12":
+        return False
+    total = 0
+    for i, ch in enumerate(reversed("80840" + npi)):
+        digit = int(ch)
+        if i % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def npi_stats() -> Dict[str, Any]:
+    return _client.stats()
+
+
+async def aclose() -> None:
+    await _client.aclose()
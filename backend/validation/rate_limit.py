@@ -0,0 +1,206 @@
+"""
+Rate limiting for the validation service's outbound calls.
+- TokenBucket: caps the request rate at the provider's quota
+- AIMDLimiter: concurrency limit that grows by ~1 per window of successes and
+  halves on 429 / timeout signals from the provider; the caller's own deadline
+  running out is not one
+- ServiceLimiter: both, used as `async with LIMITER.slot(): ...`; background
+  callers (slot(background=True)) only take capacity no live caller is
+  waiting for, and always leave a slot and half the burst spare
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+import httpx
+
+import deadline
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+AIMD_DECREASE_FACTOR = float(os.getenv("AIMD_DECREASE_FACTOR", "0.5"))
+# Several in-flight calls fail together on one throttle event; count it once
+AIMD_COOLDOWN_SECONDS = float(os.getenv("AIMD_COOLDOWN_SECONDS", "2.0"))
+# How often a background caller re-checks for spare capacity
+BACKGROUND_POLL_SECONDS = float(os.getenv("LIMITER_BACKGROUND_POLL_SECONDS", "0.2"))
+
+OVERLOAD_STATUS_CODES = {429, 503}
+# Matched by name so the provider SDKs need not be importable; "DeadlineExceeded"
+# is Google's gRPC timeout, not deadline.DeadlineExceeded (excluded by class)
+OVERLOAD_EXCEPTION_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded"}
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """True for throttling and timeout signals anywhere in the exception chain."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, deadline.DeadlineExceeded):
+            return False
+        if isinstance(exc, (asyncio.TimeoutError, TimeoutError, httpx.TimeoutException)):
+            return True
+        if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code in OVERLOAD_STATUS_CODES:
+            return True
+        if type(exc).__name__ in OVERLOAD_EXCEPTION_NAMES:
+            return True
+        if getattr(exc, "status_code", None) in OVERLOAD_STATUS_CODES:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+# -----------------------------------------------------------------------------
+# Limiters
+# -----------------------------------------------------------------------------
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # The lock keeps waiters in FIFO order instead of racing for each token
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def try_acquire(self, reserve: float = 0.0) -> bool:
+        """Takes a token only if nobody is queued and `reserve` more would still be left."""
+        if self._lock.locked():
+            return False
+        self._refill()
+        if self._tokens < 1 + reserve:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class AIMDLimiter:
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.throttle_events = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        # +1/limit per success ~= +1 per full window of successful calls
+        self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_overload(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < AIMD_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self.throttle_events += 1
+        self.limit = max(self.minimum, self.limit * AIMD_DECREASE_FACTOR)
+
+
+class ServiceLimiter:
+    def __init__(self, name: str, rate: float, burst: float, initial: int, minimum: int, maximum: int):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.aimd = AIMDLimiter(initial, minimum, maximum)
+        # Live callers queued for admission; background callers yield to them
+        self.waiting = 0
+        self.background_admitted = 0
+
+    async def _admit(self) -> None:
+        self.waiting += 1
+        try:
+            await self.aimd.acquire()
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                await self.aimd.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+    async def _admit_background(self) -> None:
+        # Check and take happen without an await in between, so no live
+        # caller can queue up in the gap
+        while True:
+            if (
+                self.waiting == 0
+                and self.aimd.in_flight + 1 < int(self.aimd.limit)
+                and self.bucket.try_acquire(reserve=self.bucket.burst / 2)
+            ):
+                self.aimd.in_flight += 1
+                self.background_admitted += 1
+                return
+            await asyncio.sleep(BACKGROUND_POLL_SECONDS)
+
+    @asynccontextmanager
+    async def slot(self, background: bool = False) -> AsyncIterator[None]:
+        await (self._admit_background() if background else self._admit())
+        try:
+            yield
+        except Exception as e:
+            # A timeout with the request deadline used up was cut short by
+            # the deadline; it says nothing about the provider
+            if is_overload_error(e) and not deadline.exhausted():
+                self.aimd.on_overload()
+            raise
+        else:
+            self.aimd.on_success()
+        finally:
+            await self.aimd.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "concurrency_limit": int(self.aimd.limit),
+            "concurrency_bounds": [self.aimd.minimum, self.aimd.maximum],
+            "in_flight": self.aimd.in_flight,
+            "waiting": self.waiting,
+            "background_admitted": self.background_admitted,
+            "throttle_events": self.aimd.throttle_events,
+        }
+
+
+def _limiter_from_env(name: str, rate: str, burst: str, initial: str, maximum: str) -> ServiceLimiter:
+    prefix = name.upper()
+    return ServiceLimiter(
+        name,
+        rate=float(os.getenv(f"{prefix}_RATE_PER_SECOND", rate)),
+        burst=float(os.getenv(f"{prefix}_BURST", burst)),
+        initial=int(os.getenv(f"{prefix}_INITIAL_CONCURRENCY", initial)),
+        minimum=int(os.getenv(f"{prefix}_MIN_CONCURRENCY", "1")),
+        maximum=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", maximum)),
+    )
+
+
+LLM_LIMITER = _limiter_from_env("llm", rate="5", burst="10", initial="4", maximum="32")
+NPI_LIMITER = _limiter_from_env("npi", rate="10", burst="20", initial="8", maximum="32")
+
+
+def limiter_snapshots() -> Dict[str, Any]:
+    return {"llm": LLM_LIMITER.snapshot(), "npi": NPI_LIMITER.snapshot()}
@@ -0,0 +1,274 @@
+"""
+Deterministic validation engine.
+- Normalizes names, phones, addresses, taxonomy descriptions and licenses
+- Scores each field against the NPI reference record
+- Applies the VALIDATION_PROMPT critical rules in code
+- Produces a ValidationResult-shaped dict, or escalates ambiguous records to the LLM
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Set
+
+# -----------------------------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------------------------
+RULE_MATCH_THRESHOLD = float(os.getenv("RULE_MATCH_THRESHOLD", "0.85"))
+RULE_MISMATCH_THRESHOLD = float(os.getenv("RULE_MISMATCH_THRESHOLD", "0.5"))
+
+MISSING_NPI = "Missing NPI Number"
+INVALID_NPI = "Invalid NPI - No match found in registry"
+
+# provider field -> reference (NPI record) field
+COMPARED_FIELDS = {
+    "name": "full_name",
+    "specialty": "specialty",
+    "phone": "phone",
+    "address": "address",
+    "license_number": "license_number",
+}
+# A mismatch on these alone is enough to need a human
+CRITICAL_FIELDS = {"name", "license_number"}
+CONFIDENCE_FIELDS = ["name", "specialty", "phone", "email", "address", "npi_number", "license_number"]
+
+NAME_NOISE = {
+    "dr", "mr", "mrs", "ms", "prof", "md", "do", "np", "pa", "rn", "dds", "dmd", "dpm", "phd",
+    "od", "pharmd", "aprn", "facc", "facs", "jr", "sr", "ii", "iii", "iv",
+}
+ADDRESS_ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "road": "rd", "boulevard": "blvd", "drive": "dr",
+    "lane": "ln", "court": "ct", "place": "pl", "suite": "ste", "highway": "hwy",
+    "parkway": "pkwy", "square": "sq", "terrace": "ter", "circle": "cir", "plaza": "plz",
+    "north": "n", "south": "s", "east": "e", "west": "w", "floor": "fl", "building": "bldg",
+}
+# Common roster specialties and the taxonomy wording the registry uses for them
+SPECIALTY_SYNONYMS = {
+    "cardiology": ["cardiovascular disease", "cardiology"],
+    "pediatrics": ["pediatrics", "pediatric"],
+    "dermatology": ["dermatology"],
+    "oncology": ["oncology", "hematology oncology", "medical oncology"],
+    "general practice": ["general practice", "family medicine", "family practice"],
+    "family medicine": ["family medicine", "family practice", "general practice"],
+    "internal medicine": ["internal medicine"],
+    "orthopedics": ["orthopaedic surgery", "orthopedic surgery", "orthopedics"],
+    "obgyn": ["obstetrics gynecology"],
+    "psychiatry": ["psychiatry neurology", "psychiatry"],
+    "neurology": ["neurology"],
+    "radiology": ["radiology", "diagnostic radiology"],
+    "nurse practitioner": ["nurse practitioner"],
+}
+
+
+@dataclass
+class RuleVerdict:
+    # Complete ValidationResult fields when the rules were decisive, else None
+    result: Optional[Dict[str, Any]]
+    field_scores: Dict[str, float] = field(default_factory=dict)
+    ambiguous_fields: List[str] = field(default_factory=list)
+
+
+# -----------------------------------------------------------------------------
+# Normalizers
+# -----------------------------------------------------------------------------
+def _words(text: Any) -> List[str]:
+    return re.findall(r"[a-z0-9]+", str(text).lower().replace("&", " and "))
+
+
+def normalize_name(text: Any) -> List[str]:
+    # Initials and credentials vary too much between rosters and the registry
+    return [w for w in _words(text) if w not in NAME_NOISE and len(w) > 1]
+
+
+def normalize_phone(text: Any) -> str:
+    digits = re.sub(r"\D", "", str(text))
+    return digits[1:] if len(digits) == 11 and digits.startswith("1") else digits
+
+
+def normalize_address(text: Any) -> List[str]:
+    words = [ADDRESS_ABBREVIATIONS.get(w, w) for w in _words(text)]
+    # ZIP+4 -> ZIP5 so "787010000" and "78701" agree
+    return [w[:5] if w.isdigit() and len(w) == 9 else w for w in words]
+
+
+def normalize_specialty(text: Any) -> str:
+    words = [w for w in _words(text) if w not in ("and", "of", "the", "specialist", "physician")]
+    return " ".join(words)
+
+
+def normalize_license(text: Any) -> str:
+    return re.sub(r"[^A-Z0-9]", "", str(text).upper())
+
+
+# -----------------------------------------------------------------------------
+# Similarity
+# -----------------------------------------------------------------------------
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _ratio(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio() if a and b else 0.0
+
+
+def name_similarity(a: Any, b: Any) -> float:
+    ta, tb = normalize_name(a), normalize_name(b)
+    if not ta or not tb:
+        return 0.0
+    sa, sb = set(ta), set(tb)
+    if sa == sb:
+        return 1.0
+    # Missing middle name on one side
+    if len(sa & sb) >= 2 and (sa <= sb or sb <= sa):
+        return 0.95
+    return max(_jaccard(sa, sb), _ratio(" ".join(sorted(ta)), " ".join(sorted(tb))))
+
+
+def phone_similarity(a: Any, b: Any) -> float:
+    pa, pb = normalize_phone(a), normalize_phone(b)
+    if not pa or not pb:
+        return 0.0
+    return 1.0 if pa == pb else 0.0
+
+
+def address_similarity(a: Any, b: Any) -> float:
+    ta, tb = normalize_address(a), normalize_address(b)
+    if not ta or not tb:
+        return 0.0
+    sa, sb = set(ta), set(tb)
+    # Street numbers must agree; a different building is never the same address
+    if ta[0].isdigit() and tb[0].isdigit() and ta[0] != tb[0]:
+        return min(_jaccard(sa, sb), 0.3)
+    # Rosters often omit city/state/ZIP: score how much of the shorter side is confirmed
+    containment = len(sa & sb) / min(len(sa), len(sb))
+    return max(_jaccard(sa, sb), containment * 0.95, _ratio(" ".join(ta), " ".join(tb)))
+
+
+def specialty_similarity(a: Any, b: Any) -> float:
+    na, nb = normalize_specialty(a), normalize_specialty(b)
+    if not na or not nb:
+        return 0.0
+    if na == nb or na in nb or nb in na:
+        return 1.0
+    for key in (na, nb):
+        other = nb if key == na else na
+        if any(phrase in other for phrase in SPECIALTY_SYNONYMS.get(key, [])):
+            return 0.95
+    return max(_jaccard(set(na.split()), set(nb.split())), _ratio(na, nb))
+
+
+def license_similarity(a: Any, b: Any) -> float:
+    la, lb = normalize_license(a), normalize_license(b)
+    if not la or not lb:
+        return 0.0
+    if la == lb:
+        return 1.0
+    # "CA45678" vs "45678": the registry often stores the number without the state
+    da, db = re.sub(r"\D", "", la), re.sub(r"\D", "", lb)
+    if da and da == db:
+        return 0.95
+    return _ratio(la, lb) * 0.8
+
+
+SIMILARITY = {
+    "name": name_similarity,
+    "specialty": specialty_similarity,
+    "phone": phone_similarity,
+    "address": address_similarity,
+    "license_number": license_similarity,
+}
+
+
+# -----------------------------------------------------------------------------
+# Evaluation
+# -----------------------------------------------------------------------------
+def _present(value: Any) -> bool:
+    return value is not None and str(value).strip() not in ("", "null", "None")
+
+
+def _ingestion_confidence(provider: Dict[str, Any], name: str) -> float:
+    confidence = provider.get("confidence") or {}
+    try:
+        return float(confidence.get(name, 0.5))
+    except (TypeError, ValueError):
+        return 0.5
+
+
+def _base_scores(provider: Dict[str, Any]) -> Dict[str, float]:
+    return {f: _ingestion_confidence(provider, f) for f in CONFIDENCE_FIELDS}
+
+
+def evaluate_provider(provider: Dict[str, Any], reference: Optional[Dict[str, Any]]) -> RuleVerdict:
+    # Critical rule 1: no NPI
+    if not _present(provider.get("npi_number")):
+        scores = _base_scores(provider)
+        scores["npi_number"] = 0.0
+        return RuleVerdict(result={
+            "updated_fields": {},
+            "discrepancies": [MISSING_NPI],
+            "confidence_scores": scores,
+            "validation_notes": ["No NPI number provided; registry comparison skipped."],
+            "requires_manual_review": True,
+        })
+
+    # Critical rule 2: NPI given but the registry has no such number. Lookup
+    # failures never get here; they are errors for the caller to retry.
+    if not reference:
+        scores = _base_scores(provider)
+        scores["npi_number"] = 0.0
+        notes = [f"NPI {provider.get('npi_number')} could not be matched in the registry."]
+        return RuleVerdict(result={
+            "updated_fields": {},
+            "discrepancies": [INVALID_NPI],
+            "confidence_scores": scores,
+            "validation_notes": notes,
+            "requires_manual_review": True,
+        })
+
+    scores = _base_scores(provider)
+    scores["npi_number"] = 1.0
+    field_scores: Dict[str, float] = {}
+    updated: Dict[str, Any] = {}
+    discrepancies: List[str] = []
+    notes: List[str] = []
+    ambiguous: List[str] = []
+
+    for name, ref_name in COMPARED_FIELDS.items():
+        value, ref_value = provider.get(name), reference.get(ref_name)
+        if not _present(ref_value):
+            continue
+        if not _present(value):
+            updated[name] = ref_value
+            scores[name] = 0.9
+            notes.append(f"Filled {name} from NPI registry.")
+            continue
+
+        score = round(SIMILARITY[name](value, ref_value), 4)
+        field_scores[name] = score
+        if score >= RULE_MATCH_THRESHOLD:
+            # Critical rule 3: matches the registry -> 0.9-1.0
+            scores[name] = max(score, 0.9)
+        elif score < RULE_MISMATCH_THRESHOLD:
+            scores[name] = score
+            updated[name] = ref_value
+            discrepancies.append(f"{name} mismatch: input '{value}' vs registry '{ref_value}'")
+        else:
+            ambiguous.append(name)
+
+    if ambiguous:
+        return RuleVerdict(result=None, field_scores=field_scores, ambiguous_fields=ambiguous)
+
+    if not discrepancies:
+        notes.append("All compared fields match the NPI registry.")
+    mismatched = {d.split(" ", 1)[0] for d in discrepancies}
+    return RuleVerdict(
+        result={
+            "updated_fields": updated,
+            "discrepancies": discrepancies,
+            "confidence_scores": scores,
+            "validation_notes": notes,
+            "requires_manual_review": bool(mismatched & CRITICAL_FIELDS) or len(discrepancies) >= 2,
+        },
+        field_scores=field_scores,
+    )
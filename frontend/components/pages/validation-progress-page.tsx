@@ -33,7 +33,7 @@ export default function ValidationProgressPage({ processingFile, onComplete }: V
   const addLog = (msg: string) => {
     const time = new Date().toLocaleTimeString('en-US', { hour12: false })
     setLogs(prev => {
-      // Avoid duplicate logs if polling hits same state multiple times
+      // Avoid duplicate logs if several events report the same stage
       if (prev.length > 0 && prev[prev.length - 1].includes(msg)) return prev
       return [...prev, `[${time}] ${msg}`]
     })
@@ -67,9 +67,12 @@ export default function ValidationProgressPage({ processingFile, onComplete }: V
         const data = await response.json()
         jobIdRef.current = data.job_id
         addLog(`Job started with ID: ${data.job_id}`)
+        if (data.queue_position) {
+          addLog(`Queued at position ${data.queue_position} (~${Math.round(data.estimated_wait_seconds)}s wait)`)
+        }
 
-        // Start Polling
-        pollStatus(data.job_id)
+        // Subscribe to pushed progress events
+        watchJob(data.job_id)
 
       } catch (err: any) {
         setError(err.message || "Start failed")
@@ -77,41 +80,60 @@ export default function ValidationProgressPage({ processingFile, onComplete }: V
       }
     }
 
-    const pollStatus = async (jobId: string) => {
-      const interval = setInterval(async () => {
-        try {
-          const res = await fetch(`${API_URL}/status/${jobId}`)
-          if (!res.ok) throw new Error("Status check failed")
-
-          const statusData = await res.json()
+    const watchJob = (jobId: string) => {
+      // Server-Sent Events: small progress deltas, then "completed" or "failed"
+      const events = new EventSource(`${API_URL}/jobs/${jobId}/events`)
+      const state: any = {}
+      let lastStage = ""
 
-          // update UI based on real backend state
-          setOverallProgress(statusData.progress)
+      events.addEventListener("progress", (e) => {
+        Object.assign(state, JSON.parse((e as MessageEvent).data))
 
-          // Logging state changes based on stage
-          if (statusData.stage === 'ingestion') addLog("Ingestion Service: Cleaning data...")
-          if (statusData.stage === 'validation') addLog("Validation Service: Checking NPI registry...")
-          if (statusData.stage === 'finalizing') addLog("Aggregating results...")
-
-          if (statusData.status === 'failed') {
-            clearInterval(interval)
-            setError(statusData.error || "Job failed")
-            addLog(`Error: ${statusData.error}`)
-          }
+        // update UI based on real backend state
+        setOverallProgress(state.progress)
 
-          if (statusData.status === 'completed') {
-            clearInterval(interval)
-            addLog("Process complete successfully.")
-            // Short delay to show 100%
-            setTimeout(() => {
-              onComplete(statusData.result)
-            }, 800)
+        // Logging state changes based on stage; events now arrive per batch
+        if (state.stage !== lastStage) {
+          const previous = state.stages?.[lastStage]
+          if (previous?.rows_per_second) {
+            addLog(`${lastStage}: ${previous.rows_done}/${previous.rows_total} rows at ${previous.rows_per_second} rows/s`)
           }
-
-        } catch (err) {
-          console.error("Polling error", err)
+          lastStage = state.stage
+          if (state.stage === 'ingestion') addLog("Ingestion Service: Cleaning data...")
+          if (state.stage === 'validation') addLog("Validation Service: Checking NPI registry...")
+          if (state.stage === 'finalizing') addLog("Aggregating results...")
+        }
+      })
+
+      events.addEventListener("failed", (e) => {
+        events.close()
+        const data = JSON.parse((e as MessageEvent).data)
+        setError(data.error || "Job failed")
+        addLog(`Error: ${data.error}`)
+      })
+
+      events.addEventListener("completed", async () => {
+        events.close()
+        addLog("Process complete successfully.")
+        try {
+          // The full result is fetched once, separately from the progress stream
+          const res = await fetch(`${API_URL}/jobs/${jobId}/result`)
+          if (!res.ok) throw new Error("Result fetch failed")
+          const result = await res.json()
+          // Short delay to show 100%
+          setTimeout(() => {
+            onComplete(result)
+          }, 800)
+        } catch (err: any) {
+          setError(err.message || "Result fetch failed")
+          addLog(`Error: ${err.message}`)
         }
-      }, 1000)
+      })
+
+      events.onerror = () => {
+        // EventSource reconnects on its own unless the stream was closed for good
+        if (events.readyState === EventSource.CLOSED) addLog("Lost connection to progress stream.")
+      }
     }
 
     startJob()